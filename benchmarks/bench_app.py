@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from analitics import OUTPUT_FILE_INDUSTRY, OUTPUT_FILE_INTRADAY, salvar_cache
+from app import load_data
+from snapshot import publicar_snapshot
+
+COLUNAS_INDUSTRY = ["TckrSymb"]
+COLUNAS_PRECOS = ["symbol"]
+
+
+@pytest.fixture
+def caches(tickers, precos, tmp_path, monkeypatch):
+    """The Parquet caches of the universe, under a scratch ./src."""
+    monkeypatch.chdir(tmp_path)
+    df_industry = pd.DataFrame({'TckrSymb': tickers, 'Industry': "Banks—Regional"})
+    salvar_cache(df_industry, OUTPUT_FILE_INDUSTRY)
+    salvar_cache(precos, OUTPUT_FILE_INTRADAY)
+    return df_industry
+
+
+def bench_load_data_colunas(benchmark, caches, tickers):
+    """The Comparativo page's load: column subsets of the caches."""
+    df_industry, df_precos, tickers_top = benchmark(load_data, colunas_industry=COLUNAS_INDUSTRY,
+                                                    colunas_precos=COLUNAS_PRECOS)
+    assert list(df_industry.columns) == COLUNAS_INDUSTRY
+    assert list(df_precos.columns) == COLUNAS_PRECOS
+    assert sorted(tickers_top) == sorted(tickers)
+
+
+def bench_load_data_colunas_snapshot(benchmark, caches, precos, tickers):
+    """The same load once the refresher has published a snapshot."""
+    publicar_snapshot(caches, precos, {})
+    df_industry, df_precos, tickers_top = benchmark(load_data, colunas_industry=COLUNAS_INDUSTRY,
+                                                    colunas_precos=COLUNAS_PRECOS)
+    assert list(df_industry.columns) == COLUNAS_INDUSTRY
+    assert list(df_precos.columns) == COLUNAS_PRECOS
+    assert sorted(tickers_top) == sorted(tickers)
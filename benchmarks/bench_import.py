@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import RAIZ
+
+# Cumulative `python -X importtime` budget per module, in milliseconds; override with IMPORT_BUDGET_<MODULE>
+IMPORT_BUDGET_MS = {"analitics": 1000, "correlation": 1000, "charts": 800, "app": 3000}
+# Loaded by the functions that need them, never on import. pyarrow is not listed: pandas imports it
+# itself whenever it is installed.
+DEFERRED_MODULES = {"yfinance", "plotly", "requests"}
+
+
+def _importar(modulo, diretorio):
+    """Imports `modulo` in a fresh interpreter, returning {imported module: cumulative microseconds}."""
+    ambiente = {**os.environ, "PYTHONPATH": os.path.join(RAIZ, "src"), "PYTHONDONTWRITEBYTECODE": "1"}
+    processo = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {modulo}"], cwd=diretorio,
+                              env=ambiente, capture_output=True, text=True, check=True)
+    tempos = {}
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, cumulativo, nome = linha.split(":", 1)[1].split("|")
+        tempos[nome.strip()] = int(cumulativo)
+    return tempos
+
+
+@pytest.mark.parametrize("modulo", sorted(IMPORT_BUDGET_MS))
+def bench_import(benchmark, modulo, tmp_path):
+    tempos = benchmark.pedantic(_importar, args=(modulo, str(tmp_path)), rounds=3, iterations=1)
+    milissegundos = tempos[modulo] / 1000
+    orcamento = float(os.environ.get(f"IMPORT_BUDGET_{modulo.upper()}", IMPORT_BUDGET_MS[modulo]))
+    benchmark.extra_info.update({"importtime_ms": milissegundos, "budget_ms": orcamento})
+
+    assert not list(tmp_path.iterdir()), "importing must not create files"
+    assert milissegundos <= orcamento, f"import {modulo} took {milissegundos:.0f} ms, over its {orcamento:.0f} ms budget"
+
+
+@pytest.mark.parametrize("modulo", ["analitics", "correlation", "charts"])
+def bench_import_adia_bibliotecas_pesadas(benchmark, modulo, tmp_path):
+    tempos = benchmark.pedantic(_importar, args=(modulo, str(tmp_path)), rounds=1, iterations=1)
+    carregados = {nome.split(".")[0] for nome in tempos} & DEFERRED_MODULES
+    assert not carregados, f"import {modulo} loaded {sorted(carregados)}"
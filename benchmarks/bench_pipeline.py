@@ -0,0 +1,84 @@
+import itertools
+import os
+
+import pandas as pd
+
+from analitics import (B3_CHUNK_SIZE, CSV_ENCODING, GITHUB_CSV_URL, TREND_MIN_BARS, atualizar_precos_incremental,
+                       baixar_precos, desempenho_normalizado, detectar_tendencias_em_lote, download_and_load_csv,
+                       download_top_n_b3, matriz_fechamentos, preencher_industry)
+from charts import DEFAULT_MAX_POINTS, grafico_linhas, reduzir_pontos
+from conftest import PRICE_INTERVAL, PRICE_PERIOD
+
+
+def bench_download_and_load_csv(benchmark):
+    df = benchmark(download_and_load_csv, GITHUB_CSV_URL, ';', CSV_ENCODING, 1, 'skip')
+    assert df is not None and not df.empty
+
+
+def bench_download_top_n_b3(benchmark, escala):
+    df = benchmark(download_top_n_b3, GITHUB_CSV_URL, escala, chunk_size=B3_CHUNK_SIZE)
+    assert 0 < len(df) <= escala
+
+
+def bench_preencher_industry(benchmark, tickers, tmp_path):
+    """Cold industry cache: every ticker is looked up."""
+    rodadas = itertools.count()
+
+    def preparar():
+        cache = tmp_path / f"industry_{next(rodadas)}.json"
+        return (pd.DataFrame({'TckrSymb': tickers}),), {"cache_path": str(cache)}
+
+    df = benchmark.pedantic(preencher_industry, setup=preparar, rounds=5)
+    assert df['Industry'].notna().all()
+
+
+def bench_preencher_industry_cache_quente(benchmark, tickers, tmp_path):
+    cache = str(tmp_path / "industry.json")
+    preencher_industry(pd.DataFrame({'TckrSymb': tickers}), cache_path=cache)
+    df = benchmark(lambda: preencher_industry(pd.DataFrame({'TckrSymb': tickers}), cache_path=cache))
+    assert df['Industry'].notna().all()
+
+
+def bench_baixar_precos(benchmark, tickers):
+    precos = benchmark(baixar_precos, tickers, interval=PRICE_INTERVAL, period=PRICE_PERIOD)
+    assert precos['symbol'].nunique() == len(tickers)
+
+
+def bench_atualizar_precos_amplia_periodo(benchmark, tickers, precos, tmp_path, monkeypatch):
+    """A store holding a month of bars, refreshed over a year: the older bars are fetched too."""
+    rodadas = itertools.count()
+    monkeypatch.chdir(tmp_path)  # the price store and caches live under ./src
+
+    def preparar():
+        rodada = tmp_path / f"rodada_{next(rodadas)}"
+        rodada.mkdir()
+        os.chdir(rodada)
+        atualizar_precos_incremental(tickers, PRICE_INTERVAL, "1mo")
+        return (tickers, PRICE_INTERVAL, PRICE_PERIOD), {}
+
+    atualizados = benchmark.pedantic(atualizar_precos_incremental, setup=preparar, rounds=3)
+    primeiros = atualizados.groupby('symbol', observed=True)['datetime'].min()
+    esperados = precos.groupby('symbol')['datetime'].min()
+    assert len(atualizados) == len(precos)
+    assert (primeiros.rename(index=str).sort_index() == esperados.sort_index()).all()
+
+
+def bench_detectar_tendencias(benchmark, precos):
+    inicios = benchmark(detectar_tendencias_em_lote, precos, TREND_MIN_BARS)
+    assert len(inicios) == precos['symbol'].nunique()
+
+
+def bench_desempenho_normalizado(benchmark, precos):
+    normalizado = benchmark(lambda: desempenho_normalizado(matriz_fechamentos(precos)))
+    assert normalizado.shape[1] == precos['symbol'].nunique()
+
+
+def bench_reduzir_pontos(benchmark, precos):
+    reduzidos = benchmark(reduzir_pontos, precos, 'datetime', 'close', DEFAULT_MAX_POINTS // 20, grupo='symbol')
+    assert len(reduzidos) <= len(precos)
+
+
+def bench_grafico_linhas(benchmark, precos):
+    fig = benchmark(grafico_linhas, precos, 'datetime', 'close', grupo='symbol')
+    assert len(fig.data) == precos['symbol'].nunique()
+
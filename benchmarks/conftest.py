@@ -0,0 +1,63 @@
+"""
+Benchmarks of the ingest -> enrich -> fetch -> render pipeline, run offline on the replay provider.
+
+Usage, from the repository root:
+    pytest benchmarks                        # all stages at 15, 150 and 1500 tickers
+    pytest benchmarks -k "15 or 150"         # a subset of the scales
+    BENCH_SCALES=15,150 pytest benchmarks    # the same, for every stage
+
+Results are saved in .benchmarks/ and each run is compared with the previous one. bench_import.py
+also tracks the `python -X importtime` cost of the main modules against a budget.
+"""
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "src"))
+
+from analitics import top_n_b3_streaming, baixar_precos  # noqa: E402
+from providers import definir_provedor, provedor_replay  # noqa: E402
+
+B3_FILE = os.path.join(RAIZ, "temp_cached_b3.csv")
+SCALES = [int(escala) for escala in os.environ.get("BENCH_SCALES", "15,150,1500").split(",")]
+PRICE_INTERVAL = "1d"
+PRICE_PERIOD = "1y"
+
+
+def pytest_generate_tests(metafunc):
+    if "escala" in metafunc.fixturenames:
+        metafunc.parametrize("escala", SCALES, scope="session")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def replay(tmp_path_factory):
+    """Makes every fetch of the session go to the replay provider, with no recorded fixtures."""
+    anterior = definir_provedor(provedor_replay(diretorio=str(tmp_path_factory.mktemp("fixtures")),
+                                                arquivo_b3=B3_FILE))
+    yield
+    definir_provedor(anterior)
+
+
+@pytest.fixture(scope="session")
+def b3_bytes():
+    with open(B3_FILE, "rb") as arquivo:
+        return arquivo.read()
+
+
+@pytest.fixture(scope="session")
+def tickers(escala, b3_bytes):
+    """
+    The `escala` most traded B3 tickers. The fixture file has fewer CASH rows than the largest
+    scale, so the universe is padded with synthetic tickers, which the replay provider serves too.
+    """
+    top = top_n_b3_streaming([b3_bytes], top_n=escala)
+    simbolos = [f"{ticker}.SA" for ticker in top['TckrSymb'].astype(str)]
+    return simbolos + [f"SYN{posicao:04d}.SA" for posicao in range(escala - len(simbolos))]
+
+
+@pytest.fixture(scope="session")
+def precos(tickers):
+    """Long-format daily prices of the universe over a year."""
+    return baixar_precos(tickers, interval=PRICE_INTERVAL, period=PRICE_PERIOD)
@@ -1,94 +1,674 @@
 
+import numpy as np
 import pandas as pd
-import yfinance as yf
 import io
-import requests
+import codecs
+import json
 import logging
 import os
+import time
+import tempfile
+import threading
+import concurrent.futures
+from contextlib import contextmanager
+import price_store
+from providers import FETCH_TIMEOUT, provedor_atual
+from timing import cronometrado, registrar_cache
 
-# Configure logging
 from datetime import date
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
 # Constants
 GITHUB_CSV_URL = "https://github.com/robsonglima/StockMarket_B3/blob/5c7977ff8b2f087ce8232a937cc39855d4adbed9/TradeInformationConsolidatedFile_20250127_1.csv?raw=true"
 TOP_N = 15
 CSV_ENCODING = 'latin1'
 OUTPUT_DIR = "src"
-
-# Create the output directory if it doesn't exist
-if not os.path.exists(OUTPUT_DIR):
-
-    os.makedirs(OUTPUT_DIR)
-OUTPUT_FILE_INDUSTRY = os.path.join(OUTPUT_DIR, "df_top_15_com_industry.csv")
-OUTPUT_FILE_INTRADAY = os.path.join(OUTPUT_DIR, "precos_intradiarios_top_15.csv")
-
-
+PRICE_COLUMNS = ["datetime", "symbol", "volume", "open", "high", "low", "close"]
+MAX_WORKERS = 8
+FETCH_RETRIES = 3
+FETCH_BACKOFF = 0.5  # seconds, doubled after each failed attempt
+
+OUTPUT_FILE_INDUSTRY = os.path.join(OUTPUT_DIR, "df_top_15_com_industry.parquet")
+OUTPUT_FILE_INTRADAY = os.path.join(OUTPUT_DIR, "precos_intradiarios_top_15.parquet")
+LEGACY_FILE_INDUSTRY = os.path.join(OUTPUT_DIR, "df_top_15_com_industry.csv")
+LEGACY_FILE_INTRADAY = os.path.join(OUTPUT_DIR, "precos_intradiarios_top_15.csv")
+INDUSTRY_CACHE_FILE = os.path.join(OUTPUT_DIR, "industry_cache.json")
+INDUSTRY_CACHE_TTL = 7 * 24 * 3600  # seconds
+B3_PRICE_COLUMNS = ["MinPric", "MaxPric", "TradAvrgPric", "LastPric", "OscnPctg"]
+B3_QUANTITY_COLUMNS = ["TradQty", "FinInstrmQty"]
+B3_CATEGORICAL_COLUMNS = ["TckrSymb", "SgmtNm"]
+B3_USECOLS = ["RptDt", "TckrSymb", "ISIN", "SgmtNm"] + B3_PRICE_COLUMNS + B3_QUANTITY_COLUMNS + ["NtlFinVol"]
+B3_DTYPES = {
+    "TckrSymb": "str",
+    "ISIN": "str",
+    "SgmtNm": "str",
+    **{coluna: "float32" for coluna in B3_PRICE_COLUMNS},
+    **{coluna: "Int32" for coluna in B3_QUANTITY_COLUMNS},  # nullable: non-traded rows are empty
+    "NtlFinVol": "float64",
+}
+TREND_MIN_BARS = 3  # consecutive moves in the same direction that make a trend
+B3_CHUNK_SIZE = 64 * 1024  # bytes per network read
+B3_BATCH_LINES = 5000  # candidate lines parsed at once
+PERIOD_START_SLACK = pd.Timedelta(days=4)  # a period may start on a weekend or holiday, before the first bar
+REQUEST_TTL = 60  # seconds a completed coalesced request is served to callers outside a render cycle
+
+# In-flight and completed requests of the current render, keyed by (kind, ticker, range...),
+# as (future, time.monotonic() of its creation)
+_REQUISICOES = {}
+_REQUISICOES_LOCK = threading.Lock()
+
+
+@cronometrado()
 def download_and_load_csv(url, delimiter, encoding, header, bad_lines_action):
     """Downloads a CSV from a URL and loads it into a Pandas DataFrame."""
+    import requests
+
     try:
-        logging.info(f"Downloading CSV de {url}")
-        response = requests.get(url)
-        response.raise_for_status()  # Check for HTTP errors
+        logging.info("Downloading CSV de %s", url)
+        conteudo = b"".join(provedor_atual().arquivo(url, B3_CHUNK_SIZE))
 
         logging.info("CSV downloaded successfully. Loading into DataFrame.")
-        df = pd.read_csv(io.StringIO(response.text), delimiter=delimiter, encoding=encoding, header=header, on_bad_lines=bad_lines_action)
+        df = pd.read_csv(io.StringIO(conteudo.decode(encoding)), delimiter=delimiter, header=header, on_bad_lines=bad_lines_action)
         return df
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error downloading CSV: {e}")
+    except (requests.exceptions.RequestException, OSError) as e:
+        logging.error("Error downloading CSV: %s", e)
         return None
     except pd.errors.ParserError as e:
-        logging.error(f"Error parsing CSV: {e}")
+        logging.error("Error parsing CSV: %s", e)
+        return None
+
+def load_b3_file(fonte, header=1, usecols=B3_USECOLS, categoricas=True, engine="c"):
+    """
+    Loads a B3 TradeInformationConsolidatedFile with a fixed, typed schema.
+
+    The file is `;`-separated, latin1-encoded and uses comma decimals. Only `usecols` are read;
+    prices are parsed as float32, quantities as nullable int32 and 'RptDt' as a date.
+
+    Args:
+        fonte (str or file-like): Path or buffer holding the file.
+        header (int): Row number of the header line; preceding lines are skipped.
+        usecols (list): Columns to read.
+        categoricas (bool): Whether to store 'TckrSymb' and 'SgmtNm' as categoricals.
+        engine (str): Pandas parser engine, "c" or "pyarrow".
+
+    Returns:
+        DataFrame: The typed B3 rows.
+    """
+    df = pd.read_csv(fonte, sep=';', decimal=',', encoding=CSV_ENCODING, header=header, usecols=usecols,
+                     dtype={coluna: tipo for coluna, tipo in B3_DTYPES.items() if coluna in usecols},
+                     parse_dates=["RptDt"] if "RptDt" in usecols else None, on_bad_lines='skip', engine=engine)
+    return _categorizar_b3(df) if categoricas else df
+
+
+def _categorizar_b3(df):
+    """Converts the low-cardinality B3 text columns to categoricals."""
+    for coluna in B3_CATEGORICAL_COLUMNS:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype("category")
+    return df
+
+
+def _linhas_de_chunks(chunks, encoding):
+    """Decodes an iterable of byte chunks and yields complete text lines."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    resto = ""
+    for chunk in chunks:
+        linhas = (resto + decoder.decode(chunk)).split("\n")
+        resto = linhas.pop()
+        yield from linhas
+    resto += decoder.decode(b"", final=True)
+    if resto:
+        yield resto
+
+
+def _atualizar_top_n(top, cabecalho, linhas, segmento, top_n):
+    """Parses a batch of lines and merges its `segmento` rows into the running top-N by 'TradQty'."""
+    lote = load_b3_file(io.StringIO("\n".join([cabecalho] + linhas)), header=0, categoricas=False)
+    lote = lote[lote['SgmtNm'] == segmento]
+    if top is not None:
+        lote = pd.concat([top, lote], ignore_index=True)
+    return lote.nlargest(top_n, 'TradQty')
+
+
+def top_n_b3_streaming(chunks, top_n=TOP_N, segmento="CASH", header=1, batch_lines=B3_BATCH_LINES):
+    """
+    Parses a B3 TradeInformationConsolidatedFile chunk by chunk, keeping only the top-N rows.
+
+    Lines are decoded as they arrive and parsed in batches of `batch_lines`. Lines that cannot
+    belong to `segmento` are discarded before parsing, and each batch is merged into a running
+    top-N by 'TradQty', so the full file is never held in memory.
+
+    Args:
+        chunks (iterable): Byte chunks of the file, e.g. `response.iter_content()`.
+        top_n (int): Number of rows to keep.
+        segmento (str): Value of 'SgmtNm' to keep.
+        header (int): Row number of the header line; preceding lines are skipped.
+        batch_lines (int): Number of candidate lines parsed at once.
+
+    Returns:
+        DataFrame: The `top_n` rows of the segment with the largest 'TradQty'.
+    """
+    linhas = _linhas_de_chunks(chunks, CSV_ENCODING)
+    for _ in range(header):
+        next(linhas, None)
+    cabecalho = next(linhas, "").rstrip("\r")
+    marcador = f";{segmento};"
+
+    top = None
+    lote = []
+    for linha in linhas:
+        if marcador in linha:
+            lote.append(linha.rstrip("\r"))
+            if len(lote) >= batch_lines:
+                top = _atualizar_top_n(top, cabecalho, lote, segmento, top_n)
+                lote = []
+    if lote or top is None:
+        top = _atualizar_top_n(top, cabecalho, lote, segmento, top_n)
+    return _categorizar_b3(top.reset_index(drop=True))
+
+
+@cronometrado()
+def download_top_n_b3(url, top_n=TOP_N, segmento="CASH", chunk_size=B3_CHUNK_SIZE):
+    """
+    Streams the B3 consolidated file from a URL and returns its top-N rows by 'TradQty'.
+
+    Returns:
+        DataFrame: The top rows of the segment, or None if the download or parsing fails.
+    """
+    import requests
+
+    try:
+        logging.info("Streaming CSV de %s", url)
+        df = top_n_b3_streaming(provedor_atual().arquivo(url, chunk_size), top_n=top_n, segmento=segmento)
+        logging.info("CSV streamed successfully.")
+        return df
+    except (requests.exceptions.RequestException, OSError) as e:
+        logging.error("Error downloading CSV: %s", e)
+        return None
+    except (pd.errors.ParserError, KeyError) as e:
+        logging.error("Error parsing CSV: %s", e)
+        return None
+
+
+@cronometrado()
+def baixar_top_industry(url=GITHUB_CSV_URL, top_n=TOP_N):
+    """
+    Downloads the B3 file and returns its top-N CASH tickers, with the '.SA' suffix and industries.
+
+    Returns:
+        DataFrame: The top companies, or None if the file could not be loaded.
+    """
+    df = download_top_n_b3(url, top_n)
+    if df is None:
+        return None
+    df['TckrSymb'] = df['TckrSymb'].cat.rename_categories(lambda ticker: f"{ticker}.SA")
+    return preencher_industry(df)
+
+
+def _criar_diretorio(caminho):
+    """Creates the directory of a file about to be written; nothing is created on import."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+
+
+@contextmanager
+def _escrita_atomica(caminho):
+    """
+    Yields a unique temporary path next to `caminho` and moves it into place once the block
+    succeeds, removing it otherwise. Concurrent writers (the refresher, other sessions) never share
+    a temporary file, so readers see one complete version or the other.
+    """
+    _criar_diretorio(caminho)
+    descritor, temporario = tempfile.mkstemp(prefix=f".{os.path.basename(caminho)}.", suffix=".tmp",
+                                             dir=os.path.dirname(caminho) or ".")
+    os.close(descritor)
+    try:
+        yield temporario
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def _carregar_cache_industry(caminho):
+    """Reads the ticker -> industry cache, returning an empty cache if it is missing or unreadable."""
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning("Ignoring unreadable industry cache %s: %s", caminho, e)
+        return {}
+
+
+def _salvar_cache_industry(cache, caminho):
+    """Writes the ticker -> industry cache atomically."""
+    with _escrita_atomica(caminho) as temporario, open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(cache, arquivo, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+def _buscar_industry(ticker, fonte_info):
+    """Fetches the industry of one ticker, returning None when the request fails."""
+    try:
+        logging.info("Fetching industry for %s", ticker)
+        industry = fonte_info(ticker).get("industry", "N/A")
+        logging.info("Industry for %s: %s", ticker, industry)
+        return industry
+    except Exception as e:
+        logging.error("Error fetching industry for %s: %s", ticker, e)
         return None
 
-def preencher_industry(df):
-    """Fetches and adds 'Industry' information to the DataFrame."""
-    industries = []
-    for ticker in df['TckrSymb']:
+
+@cronometrado()
+def preencher_industry(df, fonte_info=None, cache_path=INDUSTRY_CACHE_FILE, ttl=INDUSTRY_CACHE_TTL,
+                       max_workers=MAX_WORKERS):
+    """
+    Adds 'Industry' information to the DataFrame.
+
+    Industries are read from a persistent JSON cache first; only tickers that are missing or
+    older than `ttl` are fetched, concurrently, and written back to the cache. Failed lookups
+    are reported as "Erro" and are not cached, so they are retried on the next call.
+
+    Args:
+        df (DataFrame): Frame with a 'TckrSymb' column.
+        fonte_info (callable): Returns the info dict for a ticker. Defaults to the active provider's `info`.
+        cache_path (str): Path of the JSON cache file.
+        ttl (float): Maximum age of a cached entry, in seconds.
+        max_workers (int): Maximum number of concurrent info requests.
+
+    Returns:
+        DataFrame: The same frame with an 'Industry' column.
+    """
+    fonte_info = fonte_info or provedor_atual().info
+    cache = _carregar_cache_industry(cache_path)
+    agora = time.time()
+    industries = {ticker: entrada["industry"] for ticker, entrada in cache.items()
+                  if agora - entrada.get("fetched_at", 0) < ttl}
+
+    faltantes = [ticker for ticker in dict.fromkeys(df['TckrSymb']) if ticker not in industries]
+    registrar_cache(acertos=df['TckrSymb'].nunique() - len(faltantes), falhas=len(faltantes))
+    if faltantes:
+        logging.info("Industry cache miss for %s tickers", len(faltantes))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(faltantes)))) as executor:
+            resultados = list(executor.map(lambda ticker: _buscar_industry(ticker, fonte_info), faltantes))
+        for ticker, industry in zip(faltantes, resultados):
+            if industry is None:
+                industries[ticker] = "Erro"
+            else:
+                industries[ticker] = industry
+                cache[ticker] = {"industry": industry, "fetched_at": agora}
         try:
-            logging.info(f"Fetching industry for {ticker}")
-            info = yf.Ticker(ticker).info
-            industry = info.get("industry", "N/A")
-            industries.append(industry)
-            logging.info(f"Industry for {ticker}: {industry}")
+            _salvar_cache_industry(cache, cache_path)
+        except OSError as e:
+            logging.warning("Could not write industry cache %s: %s", cache_path, e)
+
+    df['Industry'] = df['TckrSymb'].map(industries)
+    return df
+
+@cronometrado()
+def salvar_cache(df, caminho):
+    """
+    Writes a DataFrame to a Parquet cache file atomically.
+
+    Args:
+        df (DataFrame): The frame to write.
+        caminho (str): Path of the cache file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    with _escrita_atomica(caminho) as temporario:
+        pq.write_table(tabela, temporario)
+
+
+@cronometrado()
+def ler_cache(caminho, colunas=None, memory_map=True):
+    """
+    Reads a Parquet cache file.
+
+    Args:
+        caminho (str): Path of the cache file.
+        colunas (list): Columns to read, as any sequence (e.g. the tuples of memoized callers); all
+            columns when None.
+        memory_map (bool): Whether to memory-map the file instead of reading it into a buffer.
+
+    Returns:
+        DataFrame: The cached frame, with the column types it was written with.
+    """
+    import pyarrow.parquet as pq
+
+    colunas = list(colunas) if colunas is not None else None  # pyarrow takes only a list or a dict
+    return pq.read_table(caminho, columns=colunas, memory_map=memory_map).to_pandas()
+
+
+def migrar_cache_legado():
+    """Converts the text CSV caches of previous versions to Parquet, once."""
+    if not os.path.exists(OUTPUT_FILE_INDUSTRY) and os.path.exists(LEGACY_FILE_INDUSTRY):
+        logging.info("Migrating %s to %s", LEGACY_FILE_INDUSTRY, OUTPUT_FILE_INDUSTRY)
+        df = pd.read_csv(LEGACY_FILE_INDUSTRY, sep=";", parse_dates=["RptDt"])
+        for coluna in B3_PRICE_COLUMNS + ["NtlFinVol"]:
+            if coluna in df.columns and not pd.api.types.is_numeric_dtype(df[coluna]):
+                df[coluna] = pd.to_numeric(df[coluna].str.replace(",", ".", regex=False), errors="coerce")
+        salvar_cache(df, OUTPUT_FILE_INDUSTRY)
+    if not os.path.exists(OUTPUT_FILE_INTRADAY) and os.path.exists(LEGACY_FILE_INTRADAY):
+        logging.info("Migrating %s to %s", LEGACY_FILE_INTRADAY, OUTPUT_FILE_INTRADAY)
+        salvar_cache(pd.read_csv(LEGACY_FILE_INTRADAY, parse_dates=["datetime"]), OUTPUT_FILE_INTRADAY)
+
+
+def _normalizar_precos(dados, ticker):
+    """Reshapes a single-ticker yfinance frame into the long price schema."""
+    if isinstance(dados.columns, pd.MultiIndex):
+        dados = dados.copy()
+        dados.columns = dados.columns.get_level_values(0)
+    dados = dados.reset_index()
+    dados.columns = [str(coluna).lower() for coluna in dados.columns]
+    dados = dados.rename(columns={"date": "datetime"})
+    dados["symbol"] = ticker
+    return dados[PRICE_COLUMNS]
+
+
+def _normalizar_precos_lote(dados):
+    """
+    Reshapes a wide multi-ticker yfinance frame, with (ticker, field) columns, into the long price schema.
+
+    Tickers whose columns are entirely empty are dropped, so they can be retried individually.
+    """
+    if dados is None or dados.empty or not isinstance(dados.columns, pd.MultiIndex):
+        return pd.DataFrame(columns=PRICE_COLUMNS)
+    dados = dados.stack(level=0, future_stack=True)
+    dados.index = dados.index.set_names(["datetime", "symbol"])
+    dados.columns = [str(coluna).lower() for coluna in dados.columns]
+    dados = dados.dropna(subset=["open", "high", "low", "close"], how="all").reset_index()
+    return dados[PRICE_COLUMNS]
+
+
+def _baixar_precos_ticker(ticker, fonte, tentativas, timeout, parametros):
+    """
+    Fetches one ticker from the price source, retrying failed or empty responses.
+
+    Returns:
+        DataFrame: The ticker prices in the long price schema, or None if every attempt failed.
+    """
+    for tentativa in range(1, tentativas + 1):
+        try:
+            logging.info("Fetching intraday data for %s (attempt %s/%s)", ticker, tentativa, tentativas)
+            dados = fonte(ticker, timeout=timeout, **parametros)
+            if dados is not None and not dados.empty:
+                logging.info("Data fetched for %s", ticker)
+                return _normalizar_precos(dados, ticker)
+            logging.warning("No data returned for %s", ticker)
         except Exception as e:
-            logging.error(f"Error fetching industry for {ticker}: {e}")
-            industries.append("Erro")
+            logging.error("Error fetching data for %s: %s", ticker, e)
+        if tentativa < tentativas:
+            time.sleep(FETCH_BACKOFF * 2 ** (tentativa - 1))
+    return None
 
-    
 
+def _baixar_precos_concorrente(tickers, parametros, fonte, max_workers, timeout, tentativas):
+    """Fetches each ticker with its own request on a bounded thread pool, keeping the ticker order."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers)))) as executor:
+        futuros = [executor.submit(_baixar_precos_ticker, ticker, fonte, tentativas, timeout, parametros)
+                   for ticker in tickers]
+        precos = [futuro.result() for futuro in futuros]
+    return [dados for dados in precos if dados is not None]
 
 
-    df['Industry'] = industries
-    return df
+@cronometrado()
+def baixar_precos(tickers, fonte=None, fonte_lote=None, em_lote=True, max_workers=MAX_WORKERS,
+                  timeout=FETCH_TIMEOUT, tentativas=FETCH_RETRIES, **parametros):
+    """
+    Fetches prices for a list of tickers into one long-format frame.
+
+    In batched mode the whole list is requested in a single multi-symbol call, and only the
+    symbols missing from that response fall back to concurrent single-symbol requests.
+
+    Args:
+        tickers (list): The stock ticker symbols.
+        fonte (callable): Single-symbol source called as `fonte(ticker, timeout=..., **parametros)`
+            returning a yfinance-like frame. Defaults to the active provider's `download` (see `providers`).
+        fonte_lote (callable): Multi-symbol source called as `fonte_lote(tickers, timeout=..., **parametros)`
+            returning a frame with (ticker, field) columns. Defaults to the active provider's `download_lote`.
+        em_lote (bool): Whether to try the batched request first.
+        max_workers (int): Maximum number of concurrent single-symbol requests.
+        timeout (float): Per-request timeout, in seconds, forwarded to the sources.
+        tentativas (int): Attempts per ticker in the single-symbol path.
+        **parametros: Download parameters such as `interval`, `period`, `start` and `end`.
+
+    Returns:
+        DataFrame: Prices with columns `datetime, symbol, volume, open, high, low, close`,
+                   in the same ticker order as `tickers`.
+    """
+    fonte = fonte or provedor_atual().download
+    fonte_lote = fonte_lote or provedor_atual().download_lote
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return pd.DataFrame()
 
-def consultar_precos_intradiarios_yf(tickers, intervalo, periodo):
-    """Fetches intraday price data for a list of tickers."""
     precos = []
-    for ticker in tickers:
+    pendentes = tickers
+    if em_lote and len(tickers) > 1:
         try:
-            logging.info(f"Fetching intraday data for {ticker}")
-            dados = yf.download(ticker, interval=intervalo, period=periodo, progress=False)
-            dados = dados.reset_index()
-            dados.columns = ["datetime", "open", "high", "low", "close", "volume"]
-            dados["symbol"] = ticker
+            logging.info("Fetching batched data for %s tickers", len(tickers))
+            lote = _normalizar_precos_lote(fonte_lote(tickers, timeout=timeout, **parametros))
+            if not lote.empty:
+                precos.append(lote)
+            recebidos = set(lote["symbol"])
+            pendentes = [ticker for ticker in tickers if ticker not in recebidos]
+        except Exception as e:
+            logging.error("Error fetching batched data: %s", e)
+        if pendentes:
+            logging.warning("Batched request missed %s; falling back to single-symbol requests", pendentes)
 
-            dados = dados[["datetime", "symbol", "volume", "open", "high", "low", "close"]]
-            precos.append(dados)
-            
+    if pendentes:
+        precos.extend(_baixar_precos_concorrente(pendentes, parametros, fonte, max_workers, timeout, tentativas))
+    if not precos:
+        return pd.DataFrame()
 
+    ordem = {ticker: posicao for posicao, ticker in enumerate(tickers)}
+    precos = pd.concat(precos, ignore_index=True)
+    precos = precos.assign(_ordem=precos["symbol"].map(ordem)).sort_values(["_ordem", "datetime"], kind="stable")
+    return precos.drop(columns="_ordem").reset_index(drop=True)
 
-            logging.info(f"Data fetched for {ticker}")
-        except Exception as e:
-            logging.error(f"Error fetching data for {ticker}: {e}")
+
+@cronometrado()
+def consultar_precos_intradiarios_yf(tickers, intervalo, periodo, fonte=None, fonte_lote=None, em_lote=True,
+                                     max_workers=MAX_WORKERS, timeout=FETCH_TIMEOUT, tentativas=FETCH_RETRIES,
+                                     armazenar=True):
+    """
+    Fetches intraday price data for a list of tickers.
+
+    Args:
+        tickers (list): The stock ticker symbols.
+        intervalo (str): The bar interval (e.g. "15m", "1d").
+        periodo (str): The period to fetch (e.g. "1mo", "1y").
+        fonte, fonte_lote, em_lote, max_workers, timeout, tentativas: See `baixar_precos`.
+        armazenar (bool): Whether to append the fetched bars to the local price store.
+
+    Returns:
+        DataFrame: Combined prices with columns `datetime, symbol, volume, open, high, low, close`,
+                   in the `price_store.compactar_precos` layout.
+    """
+    precos = baixar_precos(tickers, fonte=fonte, fonte_lote=fonte_lote, em_lote=em_lote, max_workers=max_workers,
+                           timeout=timeout, tentativas=tentativas, interval=intervalo, period=periodo)
+    if armazenar and not precos.empty:
+        price_store.gravar_precos(precos, intervalo)
+    return price_store.compactar_precos(precos)
+
+
+
+@cronometrado()
+def atualizar_precos_incremental(tickers, intervalo, periodo, caminho=OUTPUT_FILE_INTRADAY, fonte=None,
+                                 fonte_lote=None):
+    """
+    Refreshes the price store by fetching only the bars it is missing for `periodo`.
+
+    Symbols are grouped by their latest stored `datetime` and each group is requested from that
+    bar onwards, so the last, possibly partial, bar is refreshed as well. Symbols whose earliest
+    stored bar starts after the beginning of `periodo` (by more than `PERIOD_START_SLACK`, as a
+    period may start on a weekend or holiday) also get the older bars up to that one, so a wider
+    period than the stored one is filled in; with "max" that head range is always requested.
+    Symbols without bars of this interval in the store get the full `periodo`. The store keeps the
+    newest copy of each bar, and the prices cache at `caminho` is rewritten with the `periodo` of
+    `tickers`, without industries, which are joined on demand with `juntar_industry`.
+
+    Args:
+        tickers (list): The stock ticker symbols.
+        intervalo (str): The bar interval (e.g. "15m", "1d").
+        periodo (str): The period that must be stored for every symbol, and kept in the cache.
+        caminho (str): Path of the prices cache.
+        fonte, fonte_lote: See `baixar_precos`.
+
+    Returns:
+        DataFrame: The prices of `tickers` over `periodo`.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    inicio_periodo = price_store.inicio_do_periodo(periodo)
+    limites = price_store.limites_datetimes(tickers, intervalo)
+    novos = [ticker for ticker in tickers if ticker not in limites.index]
+
+    lotes = []
+    if novos:
+        logging.info("Fetching full period %s for %s", periodo, novos)
+        lotes.append(baixar_precos(novos, fonte=fonte, fonte_lote=fonte_lote, interval=intervalo, period=periodo))
+    primeiros = limites["primeiro"]
+    if inicio_periodo is not None:
+        primeiros = primeiros[primeiros > inicio_periodo + PERIOD_START_SLACK]
+    for primeiro, grupo in primeiros.groupby(primeiros):
+        logging.info("Fetching bars from %s to %s for %s", inicio_periodo, primeiro, grupo.index.tolist())
+        lotes.append(baixar_precos(grupo.index.tolist(), fonte=fonte, fonte_lote=fonte_lote, interval=intervalo,
+                                   start=inicio_periodo, end=primeiro))
+    for ultimo, grupo in limites["ultimo"].groupby(limites["ultimo"]):
+        logging.info("Fetching bars since %s for %s", ultimo, grupo.index.tolist())
+        lotes.append(baixar_precos(grupo.index.tolist(), fonte=fonte, fonte_lote=fonte_lote, interval=intervalo,
+                                   start=ultimo))
+    for lote in lotes:
+        price_store.gravar_precos(lote, intervalo)
+    logging.info("Fetched %s new or updated bars", sum(len(lote) for lote in lotes))
+
+    precos = price_store.consultar_precos(tickers, intervalo, inicio=inicio_periodo)
+    salvar_cache(precos, caminho)
+    return precos
+
+
+@cronometrado()
+def juntar_industry(precos, df_industry):
+    """
+    Joins each bar's industry from the top companies table, which is the industry dimension table;
+    the price caches don't repeat it on every row.
+
+    Args:
+        precos (DataFrame): Long-format prices with a 'symbol' column.
+        df_industry (DataFrame): Frame with 'TckrSymb' and 'Industry' columns.
+
+    Returns:
+        DataFrame: `precos` with a categorical 'Industry' column.
+    """
+    industrias = df_industry.drop_duplicates('TckrSymb').set_index('TckrSymb')['Industry']
+    return precos.assign(Industry=precos['symbol'].map(industrias).astype('category'))
+
+
+def iniciar_ciclo_requisicoes():
+    """
+    Forgets the coalesced requests of the previous render, so the next render fetches fresh data.
+    Requests still in flight keep serving the callers already waiting on them.
+    """
+    with _REQUISICOES_LOCK:
+        _REQUISICOES.clear()
+
+
+def _reservar_requisicoes(chaves):
+    """
+    Returns the future of each key, creating the missing ones. The keys created by this call are
+    also returned: the caller owns them and must resolve their futures.
+
+    Completed requests older than `REQUEST_TTL` are forgotten first, so callers without render
+    cycles, such as the refresher, neither grow the registry without bound nor get stale data.
+    """
+    with _REQUISICOES_LOCK:
+        agora = time.monotonic()
+        expiradas = [chave for chave, (futuro, criada) in _REQUISICOES.items()
+                     if futuro.done() and agora - criada > REQUEST_TTL]
+        for chave in expiradas:
+            del _REQUISICOES[chave]
+        proprias = [chave for chave in chaves if chave not in _REQUISICOES]
+        for chave in proprias:
+            _REQUISICOES[chave] = (concurrent.futures.Future(), agora)
+        return {chave: _REQUISICOES[chave][0] for chave in chaves}, proprias
+
+
+def _descartar_requisicoes(chaves, futuros, erro):
+    """
+    Fails the unresolved futures of a request that raised and forgets them, so a later call
+    retries it. An interruption of the owner (KeyboardInterrupt, a Streamlit rerun or stop) is
+    passed to the waiting callers as a RuntimeError, so it doesn't interrupt them too.
+    """
+    if not isinstance(erro, Exception):
+        interrupcao, erro = erro, RuntimeError(f"Request interrupted: {erro!r}")
+        erro.__cause__ = interrupcao
+    pendentes = [chave for chave in chaves if not futuros[chave].done()]
+    with _REQUISICOES_LOCK:
+        for chave in pendentes:
+            if _REQUISICOES.get(chave, (None,))[0] is futuros[chave]:
+                del _REQUISICOES[chave]
+    for chave in pendentes:
+        futuros[chave].set_exception(erro)
+
+
+@cronometrado()
+def obter_precos_coalescidos(tickers, start=None, end=None, interval="1d"):
+    """
+    Fetches prices through the request-coalescing layer.
+
+    Each (ticker, start, end, interval) is fetched at most once per render cycle (see
+    `iniciar_ciclo_requisicoes`): the tickers not requested yet are fetched together in one
+    `baixar_precos` call, and callers asking for a ticker that is already in flight wait for
+    that call instead of issuing their own.
+
+    Returns:
+        DataFrame: Long-format prices of `tickers`, in the `baixar_precos` schema.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    chaves = {ticker: ("precos", ticker, str(start), str(end), interval) for ticker in tickers}
+    futuros, proprias = _reservar_requisicoes(list(chaves.values()))
+    registrar_cache(acertos=len(chaves) - len(proprias), falhas=len(proprias))
+    if proprias:
+        pendentes = [ticker for ticker in tickers if chaves[ticker] in proprias]
+        try:
+            precos = baixar_precos(pendentes, start=start, end=end, interval=interval)
+            for ticker in pendentes:
+                dados = precos[precos['symbol'] == ticker] if not precos.empty else pd.DataFrame(columns=PRICE_COLUMNS)
+                futuros[chaves[ticker]].set_result(dados.reset_index(drop=True))
+        except BaseException as e:  # every waiter must be released, whatever stopped the owner
+            _descartar_requisicoes(proprias, futuros, e)
+            raise
+    precos = [futuros[chaves[ticker]].result() for ticker in tickers]
+    precos = [dados for dados in precos if not dados.empty]
     return pd.concat(precos, ignore_index=True) if precos else pd.DataFrame()
 
 
+@cronometrado()
+def obter_info_coalescida(ticker):
+    """Fetches the `get_company_info` of a ticker at most once per render cycle."""
+    chave = ("info", ticker)
+    futuros, proprias = _reservar_requisicoes([chave])
+    registrar_cache(acertos=1 - len(proprias), falhas=len(proprias))
+    if proprias:
+        try:
+            futuros[chave].set_result(get_company_info(ticker))
+        except BaseException as e:  # every waiter must be released, whatever stopped the owner
+            _descartar_requisicoes(proprias, futuros, e)
+            raise
+    return futuros[chave].result()
+
 
+@cronometrado()
 def get_company_data(ticker, start_date, end_date):
     """
     Fetches company information and historical prices for a given ticker.
+
+    Both go through the request-coalescing layer, so the history is shared with the other
+    consumers of the same (ticker, range) in the current render.
     
     Args:
         ticker (str): The stock ticker symbol.
@@ -99,106 +679,191 @@ def get_company_data(ticker, start_date, end_date):
         dict: A dictionary containing the company's profile, market, volume, and historical prices.
     """
     try:
-        company = yf.Ticker(ticker)
-        info = company.info
-        history = company.history(start=start_date, end=end_date)
-        return {"profile": info.get("longBusinessSummary", "N/A"), "market": info.get("market", "N/A"), "volume": history.iloc[-1]['Volume'] if not history.empty else "N/A", "history": history}
+        info = obter_info_coalescida(ticker)
+        precos = obter_precos_coalescidos([ticker], start=start_date, end=end_date)
+        history = precos.drop(columns='symbol').set_index('datetime').rename(columns=str.capitalize) if not precos.empty else pd.DataFrame()
+        return {"profile": info["profile"], "market": info["market"], "volume": history.iloc[-1]['Volume'] if not history.empty else "N/A", "history": history}
     except Exception as e:
-        logging.error(f"Error fetching data for {ticker}: {e}")
+        logging.error("Error fetching data for %s: %s", ticker, e)
         return {"profile": "N/A", "market": "N/A", "volume": "N/A", "history": pd.DataFrame()}
 
 
-def analyze_trend_initiation(tickers, start_date, end_date):
+@cronometrado()
+def get_company_info(ticker, fonte_info=None):
+    """
+    Fetches the company profile and market for a given ticker, without its price history.
+
+    Returns:
+        dict: A dictionary containing the company's profile and market.
+    """
+    try:
+        info = (fonte_info or provedor_atual().info)(ticker)
+        return {"profile": info.get("longBusinessSummary", "N/A"), "market": info.get("market", "N/A")}
+    except Exception as e:
+        logging.error("Error fetching company info for %s: %s", ticker, e)
+        return {"profile": "N/A", "market": "N/A"}
+
+
+def _codificar_runs(sinais):
+    """Run-length encodes an array of move signs, returning each run's start, length and sign."""
+    inicios = np.concatenate(([0], np.flatnonzero(sinais[1:] != sinais[:-1]) + 1))
+    comprimentos = np.diff(np.append(inicios, sinais.size))
+    return inicios, comprimentos, sinais[inicios]
+
+
+@cronometrado()
+def detectar_tendencias_em_lote(precos, k=1):
+    """
+    Finds the first downward and upward trend start of every symbol in a long-format price frame.
+
+    All symbols are scanned together: the frame is sorted once, the close-to-close moves are
+    reduced to their signs over the whole close array, with the moves that cross a symbol boundary
+    masked out, and the runs are encoded in a single pass with `_codificar_runs`.
+
+    Args:
+        precos (DataFrame): Prices with 'symbol', 'datetime' and 'close' columns.
+        k (int): Minimum number of consecutive moves in the same direction.
+
+    Returns:
+        DataFrame: Indexed by symbol, with the 'downward' and 'upward' trend start datetimes
+                   (NaT when a symbol has no such run).
+    """
+    precos = precos.sort_values(['symbol', 'datetime'], kind="stable")
+    codigos, simbolos = pd.factorize(precos['symbol'], sort=True)
+    datas = precos['datetime'].to_numpy()
+    resultado = pd.DataFrame(index=pd.Index(simbolos, name='symbol'), columns=['downward', 'upward'],
+                             dtype=precos['datetime'].dtype)
+    if len(codigos) < 2:
+        return resultado
+
+    sinais = np.sign(np.diff(precos['close'].to_numpy(dtype=float)))
+    sinais[codigos[1:] != codigos[:-1]] = np.nan  # NaN never equals a neighbour, so runs break here
+    inicios, comprimentos, sinais_runs = _codificar_runs(sinais)
+
+    for coluna, sinal in (('downward', -1), ('upward', 1)):
+        # a move at position j goes from bar j to bar j + 1, which is the bar that starts the trend
+        barras = inicios[(sinais_runs == sinal) & (comprimentos >= k)] + 1
+        # runs are in time order within each symbol, so the first one per symbol is the earliest
+        codigos_runs, primeiros = np.unique(codigos[barras], return_index=True)
+        resultado.iloc[codigos_runs, resultado.columns.get_loc(coluna)] = datas[barras[primeiros]]
+    return resultado
+
+
+@cronometrado()
+def matriz_fechamentos(precos, coluna='close', preencher=True):
+    """
+    Pivots long-format prices into a wide matrix aligned on the union of their datetimes.
+
+    A symbol without a bar at some datetime carries its previous close forward when `preencher`
+    is set, and is NaN there otherwise; datetimes before its first bar stay NaN.
+
+    Args:
+        precos (DataFrame): Prices with 'symbol', 'datetime' and `coluna` columns.
+        coluna (str): Price column to pivot.
+        preencher (bool): Carry closes forward over missing bars.
+
+    Returns:
+        DataFrame: Indexed by datetime, with one column per symbol.
+    """
+    fechamentos = precos.pivot_table(index='datetime', columns='symbol', values=coluna, aggfunc='last',
+                                     observed=True).sort_index()
+    return fechamentos.ffill() if preencher else fechamentos
+
+
+@cronometrado()
+def desempenho_normalizado(fechamentos, base=100.0):
+    """
+    Rebases every column of a close-price matrix to `base` at its first valid price.
+
+    The value at each row is `base * close / first close`, the compounded return since the
+    start of the period, computed for all columns in one array operation.
+
+    Args:
+        fechamentos (DataFrame): Close prices indexed by datetime, one column per symbol, as
+            returned by `matriz_fechamentos`.
+        base (float): Value every series starts at.
+
+    Returns:
+        DataFrame: Normalized performance with the same index and columns.
+    """
+    valores = fechamentos.to_numpy(dtype=float)
+    if valores.size == 0:
+        return fechamentos.astype(float)
+    primeiras = np.argmax(~np.isnan(valores), axis=0)  # row of each column's first valid price
+    referencias = valores[primeiras, np.arange(valores.shape[1])]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalizado = valores / referencias * base
+    return pd.DataFrame(normalizado, index=fechamentos.index, columns=fechamentos.columns)
+
+
+@cronometrado()
+def analyze_trend_initiation(tickers, start_date=None, end_date=None, k=TREND_MIN_BARS, precos=None):
     """
     Analyzes the initiation of upward and downward trends for a list of stock tickers.
 
     Args:
-        tickers (list): List of stock tickers.
+        tickers (list): List of stock tickers; all symbols of `precos` when empty and `precos` is given.
         start_date (date): Start date for the analysis.
         end_date (date): End date for the analysis.
+        k (int): Number of consecutive moves in the same direction that make a trend.
+        precos (DataFrame): Long-format prices ('symbol', 'datetime', 'close') to scan instead of
+            downloading them, e.g. the `precos_intradiarios` frame.
 
     Returns:
         tuple: Two dictionaries, one for downward trends and one for upward trends.
                Each dictionary contains ticker symbols as keys and the trend initiation
                time as values.
     """
-    downward_trends = {}
-    upward_trends = {}
-    for ticker in tickers:
-        try:
-            ticker_data = yf.download(ticker, start=start_date, end=end_date)
-            if not ticker_data.empty:
-                # Implement logic to detect trend initiation
-                # Example: check for a series of consecutive decreases or increases
-                data = ticker_data['Close']
-                for i in range(1, min(len(data), 4)): # Iterate only the first 3 lines
-                    if data[i] < data[i - 1]:
-                        # Check for a series of decreases to consider it a trend
-                        consecutive_decreases = all(data[j] < data[j-1] for j in range(i, max(0, i-3),-1))
-
-                        if consecutive_decreases and ticker not in downward_trends:
-                            downward_trends[ticker] = data.index[i].strftime('%Y-%m-%d')
-                            break # Stop when one trend is found
-                    elif data[i] > data[i - 1]:
-                        # Check for a series of increases to consider it a trend
-                        consecutive_increases = all(data[j] > data[j-1] for j in range(i, max(0, i-3),-1))
-                        if consecutive_increases and ticker not in upward_trends:
-                            upward_trends[ticker] = data.index[i].strftime('%Y-%m-%d')
-                            break # Stop when one trend is found
-        except Exception as e:
-            logging.error(f"Error analyzing trends for {ticker}: {e}")
+    if precos is None:
+        precos = obter_precos_coalescidos(tickers, start=start_date, end=end_date)
+    elif tickers:
+        precos = precos[precos['symbol'].isin(tickers)]
+    if precos.empty:
+        logging.warning("No prices to analyze trends for %s", tickers)
+        return {}, {}
+
+    try:
+        inicios = detectar_tendencias_em_lote(precos, k)
+    except Exception as e:
+        logging.error("Error analyzing trends for %s: %s", tickers, e)
+        return {}, {}
+    downward_trends = inicios['downward'].dropna().dt.strftime('%Y-%m-%d').to_dict()
+    upward_trends = inicios['upward'].dropna().dt.strftime('%Y-%m-%d').to_dict()
     return downward_trends, upward_trends
 
 
-def load_data(interval = "1d", period="1y"):
+@cronometrado()
+def load_data(interval = "1d", period="1y", colunas_industry=None, colunas_precos=None):
     """
     Load the data
+
+    The Parquet caches are read when present, restricted to `colunas_industry` and
+    `colunas_precos` if given; otherwise the data is downloaded and the caches rewritten.
     """
-    logging.info(f"Loading data with interval {interval} and period {period}")
+    logging.info("Loading data with interval %s and period %s", interval, period)
 
     data_frame_top_15_industry = pd.DataFrame()
     data_frame_precos_intradiarios = pd.DataFrame()
     tickers_top_15 = []
-    if os.path.exists("src/df_top_15_com_industry.csv") and os.path.exists("src/precos_intradiarios_top_15.csv"):
-        data_frame_top_15_industry = pd.read_csv("src/df_top_15_com_industry.csv", sep=";")
-        data_frame_precos_intradiarios = pd.read_csv("src/precos_intradiarios_top_15.csv")
+    migrar_cache_legado()
+    if os.path.exists(OUTPUT_FILE_INDUSTRY) and os.path.exists(OUTPUT_FILE_INTRADAY):
+        data_frame_top_15_industry = ler_cache(OUTPUT_FILE_INDUSTRY, colunas_industry)
+        data_frame_precos_intradiarios = ler_cache(OUTPUT_FILE_INTRADAY, colunas_precos)
+        if 'TckrSymb' in data_frame_top_15_industry.columns:
+            tickers_top_15 = data_frame_top_15_industry['TckrSymb'].tolist()
     if data_frame_top_15_industry.empty or data_frame_precos_intradiarios.empty:
       try:
-          df = download_and_load_csv(GITHUB_CSV_URL, ';', CSV_ENCODING, 1, 'skip')
+          df = baixar_top_industry()
           if df is not None:
-              df['TckrSymb'] = df['TckrSymb'] + '.SA'
-              df_filtrado_segmento = df[df['SgmtNm'].str.contains('CASH', na=False)]
-              data_frame_top_15_industry = df_filtrado_segmento.nlargest(TOP_N, 'TradQty')
-              data_frame_top_15_industry = preencher_industry(data_frame_top_15_industry)
-              data_frame_top_15_industry.to_csv(OUTPUT_FILE_INDUSTRY, index=False, sep=";")
+              data_frame_top_15_industry = df
+              salvar_cache(data_frame_top_15_industry, OUTPUT_FILE_INDUSTRY)
               tickers_top_15 = data_frame_top_15_industry['TckrSymb'].tolist()
               data_frame_precos_intradiarios = consultar_precos_intradiarios_yf(tickers_top_15,interval, period)
-
-              industry_mapping = data_frame_top_15_industry.set_index('TckrSymb')['Industry'].to_dict()
-              data_frame_precos_intradiarios['Industry'] = data_frame_precos_intradiarios['symbol'].map(industry_mapping)
-              data_frame_precos_intradiarios.to_csv(OUTPUT_FILE_INTRADAY, index=False)
+              salvar_cache(data_frame_precos_intradiarios, OUTPUT_FILE_INTRADAY)
               logging.info("Data load with successful.")
       except Exception as e:
-          logging.error(f"Error loading data: {e}")
+          logging.error("Error loading data: %s", e)
     if data_frame_top_15_industry.empty:
         return pd.DataFrame(), pd.DataFrame(), []
     else:
         return data_frame_top_15_industry, data_frame_precos_intradiarios, tickers_top_15
-
-    window_size = 3
-    for ticker in tickers:
-        ticker_data = yf.download(ticker, start=start_date, end=end_date, progress=False)
-        if not ticker_data.empty:
-            data = ticker_data['Close']
-            for i in range(window_size, len(data)):
-                if all(data[j] > data[j+1] for j in range(i - window_size + 1, i)):
-                    if ticker not in downward_trends:   
-                        downward_trends[ticker] = data.index[i].strftime('%Y-%m-%d')
-                        break
-                elif all(data[j] < data[j+1] for j in range(i - window_size + 1, i)):
-                    if ticker not in upward_trends:
-                        upward_trends[ticker] = data.index[i].strftime('%Y-%m-%d')
-                        break
-    
-
-    
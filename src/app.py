@@ -1,19 +1,31 @@
 import streamlit as st
 import pandas as pd
 import os
-import yfinance as yf
 import logging
-import plotly.express as px
-from analitics import consultar_precos_intradiarios_yf, get_company_data
-
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-def show_company_info(company_data, ticker):
+from analitics import (OUTPUT_FILE_INDUSTRY, OUTPUT_FILE_INTRADAY, atualizar_precos_incremental, baixar_precos,
+                       consultar_precos_intradiarios_yf, desempenho_normalizado, detectar_tendencias_em_lote,
+                       get_company_data, ler_cache, matriz_fechamentos, migrar_cache_legado,
+                       obter_precos_coalescidos)
+from price_store import consultar_precos, inicio_do_periodo
+from snapshot import ler_snapshot, snapshot_atual
+from timing import cronometrado, registrar_cache
+from charts import DEFAULT_MAX_POINTS, grafico_correlacao, grafico_linhas
+from correlation import atualizar_correlacao_online, correlacao_recente, correlacoes, lead_lag
+
+DATA_CACHE_ENTRIES = 32  # memoized load_data results kept across reruns
+# Interval labels shown on the pages -> yfinance / price store intervals
+YF_INTERVALS = {"1min": "1m", "2min": "2m", "5min": "5m", "15min": "15m", "30min": "30m", "60min": "60m",
+                "90min": "90m"}
+SNAPSHOT_COVERAGE_SLACK = pd.Timedelta(days=7)  # a range may start on a weekend or holiday
+
+def show_company_info(company_data, ticker, max_points=DEFAULT_MAX_POINTS):
     """
     Exibe informações da empresa e um gráfico de linha para um determinado ticker.
 
     Args:
         company_data (dict): Um dicionário contendo os dados da empresa.
         ticker (str): O símbolo do ticker.
+        max_points (int): Número máximo de pontos enviados ao gráfico (None para todos).
     """
     st.subheader(f"Informaçoes da empresa: {ticker}")
 
@@ -30,11 +42,13 @@ def show_company_info(company_data, ticker):
         last_price = company_data["history"]["Close"].iloc[-1]
         st.write(f"**Preço Atual:** {last_price}")
 
-        fig = px.line(
-            company_data["history"],
-            x=company_data["history"].index,
+        history = company_data["history"].rename_axis("Date").reset_index()
+        fig = grafico_linhas(
+            history,
+            x="Date",
             y="Close",
-            title=f"Preços históricos para {ticker}",
+            titulo=f"Preços históricos para {ticker}",
+            max_pontos=max_points,
         ) #Gera o grafico
         
         st.plotly_chart(fig)
@@ -43,9 +57,87 @@ def show_company_info(company_data, ticker):
 
 
 # def para carregar Dataframes
-def load_data():
+@st.cache_data(show_spinner=False, max_entries=DATA_CACHE_ENTRIES)
+def _ler_dados(interval, period, colunas_industry, colunas_precos, mtime_industry, mtime_precos):
+    """
+    Reads both cache files. Memoized across reruns: the key includes the file mtimes,
+    so a rewritten cache is read again without an explicit invalidation.
+    """
+    logging.info("Reading data caches for interval %s and period %s", interval, period)
+    registrar_cache(falhas=1)  # only runs on a memoization miss; counted on the load_data span
+    df_top_15_industry = ler_cache(OUTPUT_FILE_INDUSTRY, colunas_industry)
+    df_precos_intradiarios = ler_cache(OUTPUT_FILE_INTRADAY, colunas_precos)
+    return df_top_15_industry, df_precos_intradiarios
+
+
+@st.cache_data(show_spinner=False, max_entries=DATA_CACHE_ENTRIES)
+def _ler_snapshot(destino, colunas_industry=None, colunas_precos=None):
+    """Reads a published snapshot. Snapshots are immutable, so their directory is the whole key."""
+    logging.info("Reading snapshot %s", destino)
+    registrar_cache(falhas=1)
+    return ler_snapshot(destino, colunas_industry, colunas_precos)
+
+
+def invalidate_data_cache():
+    """Drops every memoized `load_data` result; called after the data is refreshed."""
+    logging.info("Invalidating memoized data.")
+    _ler_dados.clear()
+
+
+@cronometrado()
+def snapshot_prices(tickers, start_date, end_date):
+    """
+    Returns the snapshot prices of the tickers between two dates, without touching the network.
+
+    Returns:
+        DataFrame: Long-format prices, or None when there is no snapshot or it doesn't cover
+                   the range for every ticker, so the caller has to fetch them.
+    """
+    destino = snapshot_atual()
+    if destino is None:
+        return None
+    _, precos, _ = _ler_snapshot(destino)
+    precos = precos[precos['symbol'].isin(tickers)]
+    primeiros = precos.groupby('symbol', observed=True)['datetime'].min()
+    if len(primeiros) < len(set(tickers)) or (primeiros > pd.Timestamp(start_date) + SNAPSHOT_COVERAGE_SLACK).any():
+        logging.info("Snapshot doesn't cover %s from %s; fetching them", tickers, start_date)
+        return None
+    intervalo = (precos['datetime'] >= pd.Timestamp(start_date)) & (precos['datetime'] < pd.Timestamp(end_date) + pd.Timedelta(days=1))
+    return precos[intervalo].reset_index(drop=True)
+
+
+@cronometrado()
+def company_data(ticker, start_date, end_date):
+    """
+    Returns the company info and price history in the `get_company_data` format, served from the
+    current snapshot when it covers the range and fetched otherwise.
+    """
+    destino = snapshot_atual()
+    precos = snapshot_prices([ticker], start_date, end_date)
+    if destino is None or precos is None:
+        return get_company_data(ticker, start_date, end_date)
+    _, _, manifesto = _ler_snapshot(destino)
+    info = manifesto["empresas"].get(ticker, {})
+    history = precos.drop(columns='symbol').set_index('datetime').rename(columns=str.capitalize)
+    return {"profile": info.get("profile", "N/A"), "market": info.get("market", "N/A"),
+            "volume": history.iloc[-1]['Volume'] if not history.empty else "N/A", "history": history}
+
+
+@cronometrado(cache_padrao=True)
+def load_data(interval=None, period=None, colunas_industry=None, colunas_precos=None):
     """
-    Loads the DataFrames from CSV files and extracts the top 15 tickers.
+    Loads the DataFrames from the current refresher snapshot, or from the Parquet caches when
+    no snapshot was published, and extracts the top 15 tickers.
+
+    Results are memoized per interval, period, column selection and cache file mtime,
+    so Streamlit reruns don't read the files again.
+
+    Args:
+        interval (str): Interval selected on the page, part of the memoization key.
+        period (str): Period selected on the page, part of the memoization key.
+        colunas_industry (list): Columns to read from the top 15 cache; all when None.
+        colunas_precos (list): Columns to read from the prices cache; all when None.
+            'symbol' is always read, since the tickers are taken from it.
 
     Returns:
         tuple: A tuple containing the df_top_15_industry DataFrame,
@@ -53,25 +145,35 @@ def load_data():
                the top 15 tickers. or list with tickers.
     """
     logging.info("Attempting to load data...")
-    csv_top_15_industry_path = "src/df_top_15_com_industry.csv"
-    csv_precos_intradiarios_path = "src/precos_intradiarios_top_15.csv"
+    migrar_cache_legado()
 
-    if not os.path.exists(csv_top_15_industry_path):
-        st.warning("Arquivos CSV não encontrados")
-        logging.warning("CSV files missing.")
+    if not os.path.exists(OUTPUT_FILE_INDUSTRY) and snapshot_atual() is None:
+        st.warning("Arquivos de cache não encontrados")
+        logging.warning("Cache files missing.")
         return None, None, None
 
-    if not os.path.exists(csv_precos_intradiarios_path):
-        logging.warning(f"File {csv_precos_intradiarios_path} not found.")
-        st.warning("Arquivos CSV de precos nao encontrados. Por favor, execute o script analytics.py primeiro.")        
+    if not os.path.exists(OUTPUT_FILE_INTRADAY) and snapshot_atual() is None:
+        logging.warning("File %s not found.", OUTPUT_FILE_INTRADAY)
+        st.warning("Arquivos de cache de precos nao encontrados. Por favor, execute o script analytics.py primeiro.")        
         return None, None, None
 
-    df_top_15_industry = pd.read_csv(csv_top_15_industry_path, sep=";")
-    try:
+    if colunas_precos is not None and 'symbol' not in colunas_precos:
+        colunas_precos = ['symbol'] + list(colunas_precos)
 
-        df_precos_intradiarios = pd.read_csv(csv_precos_intradiarios_path)
-    except pd.errors.EmptyDataError:
-        return None, None, None
+    destino = snapshot_atual()
+    if destino is not None:
+        df_top_15_industry, df_precos_intradiarios, _ = _ler_snapshot(
+            destino,
+            tuple(colunas_industry) if colunas_industry is not None else None,
+            tuple(colunas_precos) if colunas_precos is not None else None)
+        tickers_top_15 = df_precos_intradiarios['symbol'].unique().tolist() if not df_precos_intradiarios.empty else []
+        return df_top_15_industry, df_precos_intradiarios, tickers_top_15
+
+    df_top_15_industry, df_precos_intradiarios = _ler_dados(
+        interval, period,
+        tuple(colunas_industry) if colunas_industry is not None else None,
+        tuple(colunas_precos) if colunas_precos is not None else None,
+        os.path.getmtime(OUTPUT_FILE_INDUSTRY), os.path.getmtime(OUTPUT_FILE_INTRADAY))
 
     
     logging.info("Data loaded successfully.")
@@ -82,14 +184,36 @@ def load_data():
     return df_top_15_industry, df_precos_intradiarios, tickers_top_15
 
 
-def update_data_frames(tickers, interval, period):
+@cronometrado()
+def load_price_history(tickers, interval, period, colunas=None):
+    """
+    Queries the local price store for the bars of the given tickers over a period.
+
+    Args:
+        tickers (list): The stock tickers to read.
+        interval (str): Interval label selected on the page, e.g. "15min" or "1d".
+        period (str): Period selected on the page, e.g. "1mo" or "ytd".
+        colunas (list): Columns to read; all when None.
+
+    Returns:
+        DataFrame: The stored bars, empty if the store has none for this interval.
+    """
+    interval = YF_INTERVALS.get(interval, interval)
+    logging.info("Querying stored %s bars of %s for period %s", interval, tickers, period)
+    return consultar_precos(tickers, interval, inicio=inicio_do_periodo(period), colunas=colunas)
+
+
+@cronometrado()
+def update_data_frames(tickers, interval, period, incremental=True):
     """
     Updates the DataFrames by consulting intraday prices for the given tickers.
 
     Args:
         tickers (list): A list of stock tickers to update.
-        interval (string): the interval of time to consult
+        interval (string): the interval of time to consult, as labelled on the page (e.g. "15min")
         period (string): the period of time to consult
+        incremental (bool): Fetch only the bars newer than the cached ones and merge them into
+            the prices cache, instead of downloading the whole period.
     Returns:
         tuple: A tuple containing the df_top_15_industry DataFrame, and the 
                updated df_precos_intradiarios DataFrame.
@@ -98,10 +222,16 @@ def update_data_frames(tickers, interval, period):
     if not tickers:
         logging.error("Could not retrieve tickers.")
         return None
-    df_precos_intradiarios = consultar_precos_intradiarios_yf(tickers, interval, period)
+    interval = YF_INTERVALS.get(interval, interval)
+    if incremental:
+        df_precos_intradiarios = atualizar_precos_incremental(tickers, interval, period)
+    else:
+        df_precos_intradiarios = consultar_precos_intradiarios_yf(tickers, interval, period)
 
     if df_precos_intradiarios.empty:
         st.warning("Sem dados retornados para o período selecionado. Por favor, altere a data ou período.")
+    else:
+        atualizar_correlacao_online(df_precos_intradiarios, interval)
   
 
     logging.info("Data frames atualizados com sucesso.")
@@ -113,8 +243,9 @@ def display_top_15_table(df):
     """Displays the table of top 15 companies."""
     logging.info("Displaying top 15 companies table...")
     if df is not None:
-        logging.info(f"DataFrame content for display_top_15_table():\n{df.head()}")
-        logging.info(f"DataFrame types:\n{df.dtypes}")
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("DataFrame content for display_top_15_table():\n%s", df.head())
+            logging.debug("DataFrame types:\n%s", df.dtypes)
         st.dataframe(df)
         logging.info("Top 15 companies table displayed successfully.")
     else: # se o df for vazio
@@ -125,8 +256,9 @@ def display_intraday_prices_table(df):
     """Displays the intraday prices table."""
     logging.info("Displaying intraday prices table...")
     if df is not None:
-        logging.info(f"DataFrame content for display_intraday_prices_table():\n{df.head()}")
-        logging.info(f"DataFrame types:\n{df.dtypes}")
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("DataFrame content for display_intraday_prices_table():\n%s", df.head())
+            logging.debug("DataFrame types:\n%s", df.dtypes)
         st.dataframe(df)
         logging.info("Intraday prices table displayed successfully.")
     else: #se o dataframe for vazio
@@ -135,7 +267,7 @@ def display_intraday_prices_table(df):
 
 # def para rodar o app
 # Main app structure
-def run_app(df_top_15_industry, df_precos_intradiarios, tickers_top_15):
+def run_app(df_top_15_industry, df_precos_intradiarios, tickers_top_15, max_points=DEFAULT_MAX_POINTS):
     """Main function to run the Streamlit app."""
     st.title("Análise do Mercado de Ações")
     logging.info("Starting Streamlit app...")
@@ -150,6 +282,7 @@ def run_app(df_top_15_industry, df_precos_intradiarios, tickers_top_15):
         
         if st.button("Atualizar"):
             df_precos_intradiarios = update_data_frames(tickers_list, "1d", "1mo")
+            invalidate_data_cache()
             
             if  df_precos_intradiarios is not None and df_top_15_industry is not None:
                 st.success("Dados atualizados com sucesso!")
@@ -173,13 +306,14 @@ def run_app(df_top_15_industry, df_precos_intradiarios, tickers_top_15):
                 line_color = 'green'
             else:
                 line_color = 'red'
-            fig = px.line(ticker_data, x='datetime', y='close', title=f'Time Series for {selected_ticker}', color_discrete_sequence=[line_color])
+            fig = grafico_linhas(ticker_data, 'datetime', 'close', titulo=f'Time Series for {selected_ticker}',
+                                 cores=[line_color], max_pontos=max_points)
             st.plotly_chart(fig)
 
     else:
         logging.error("One or both DataFrames are None. Content will not be displayed.")
 
-def show_comparative_graph(selected_tickers, start_date, end_date):
+def show_comparative_graph(selected_tickers, start_date, end_date, max_points=DEFAULT_MAX_POINTS):
     """
     Exibe um gráfico de linha comparativo dos preços de fechamento dos tickers selecionados.
 
@@ -187,6 +321,7 @@ def show_comparative_graph(selected_tickers, start_date, end_date):
         selected_tickers (list): Uma lista de símbolos de ticker.
         start_date (date): A data de início para os preços históricos.
         end_date (date): A data de término para os preços históricos.
+        max_points (int): Número máximo de pontos por ticker enviados ao gráfico (None para todos).
     """    
     if not selected_tickers:
         return
@@ -197,36 +332,98 @@ def show_comparative_graph(selected_tickers, start_date, end_date):
         st.write('Disclaimer: Este gráfico exibe os preços normalizados das ações selecionadas. A normalização permite comparar o desempenho relativo de diferentes ativos, ajustando seus preços para começar em 100 no início do período. Um valor acima de 100 indica valorização, enquanto abaixo de 100 indica desvalorização. Esta metodologia facilita a visualização da trajetória dos ativos, independentemente de seus preços iniciais.')
        # Fetch data for BOVA11.SA
         if "BOVA11.SA" in selected_tickers:
-            company_data = get_company_data("BOVA11.SA", start_date, end_date)
             # Display information for BOVA11.SA
-            show_company_info(company_data, "BOVA11.SA")
+            show_company_info(company_data("BOVA11.SA", start_date, end_date), "BOVA11.SA")
             
-       # Fetch historical data for each ticker
-        all_data = {}
+       # Historical data for each ticker, from the snapshot when it covers the range
+        precos = snapshot_prices(tickers_for_comparison, start_date, end_date)
+        if precos is None:
+            precos = obter_precos_coalescidos(tickers_for_comparison, start=start_date, end=end_date)
+        precos = precos[precos['symbol'].isin(tickers_for_comparison)] if not precos.empty else precos
+        com_dados = set(precos['symbol']) if not precos.empty else set()
         for ticker in tickers_for_comparison:
-            try:
-                data = yf.download(ticker, start=start_date, end=end_date)
-                if not data.empty:
-                    data['pct_change'] = data['Close'].pct_change() * 100
-                    data['normalized'] = (100 + data['pct_change'].cumsum())
-                    all_data[ticker] = data['normalized']
-            except Exception as e:
-                st.error(f"Error fetching data for {ticker}: {e}")
+            if ticker not in com_dados:
+                st.error(f"Error fetching data for {ticker}")
 
         #  graph comparativo
-        if all_data:
-            comparison_df = pd.DataFrame(all_data)
-            fig = px.line(comparison_df, title='Comparação de Preços Normalizados')
+        if not precos.empty:
+            normalizado = desempenho_normalizado(matriz_fechamentos(precos))
+            comparison_df = normalizado.rename_axis(index='Data', columns=None).reset_index()
+            comparison_df = comparison_df.melt(id_vars='Data', var_name='Ticker', value_name='Normalizado').dropna()
+            fig = grafico_linhas(comparison_df, 'Data', 'Normalizado', grupo='Ticker',
+                                 titulo='Comparação de Preços Normalizados', max_pontos=max_points)
             fig.update_layout(xaxis_title="Data", yaxis_title="Preço Normalizado (%)")
             st.plotly_chart(fig)
     else:
         # Fetch data for BOVA11.SA
         if "BOVA11.SA" in selected_tickers:
-            company_data = get_company_data("BOVA11.SA", start_date, end_date)
-            show_company_info(company_data, "BOVA11.SA")
+            show_company_info(company_data("BOVA11.SA", start_date, end_date), "BOVA11.SA")
         st.write("Selecione dois ou mais tickers para comparar")
 
-def analyze_trend_initiation(selected_tickers, start_date, end_date):
+def show_graph_selected_tickers(df_precos, selected_tickers, max_points=DEFAULT_MAX_POINTS):
+    """
+    Exibe um gráfico de linha com os preços de fechamento dos tickers selecionados.
+
+    Args:
+        df_precos (DataFrame): Preços em formato longo ('symbol', 'datetime', 'close').
+        selected_tickers (list): Uma lista de símbolos de ticker.
+        max_points (int): Número máximo de pontos por ticker enviados ao gráfico (None para todos).
+    """
+    precos = df_precos[df_precos['symbol'].isin(selected_tickers)]
+    if precos.empty:
+        st.write("Sem dados de preços para os tickers selecionados.")
+        return
+    fig = grafico_linhas(precos, 'datetime', 'close', grupo='symbol', titulo='Preços de Fechamento',
+                         max_pontos=max_points)
+    fig.update_layout(xaxis_title="Data", yaxis_title="Preço de Fechamento")
+    st.plotly_chart(fig, width="stretch")
+
+def show_correlation_heatmap(df_precos, interval, janela=None, metodo="pearson"):
+    """
+    Exibe a matriz de correlação dos retornos dos tickers de um DataFrame de preços.
+
+    Args:
+        df_precos (DataFrame): Preços em formato longo ('symbol', 'datetime', 'close').
+        interval (str): Intervalo das barras selecionado na página, parte da chave do cache.
+        janela (int): Janela móvel em barras; o período inteiro quando None.
+        metodo (str): "pearson" ou "spearman".
+    """
+    if df_precos is None or df_precos['symbol'].nunique() < 2:
+        st.write("Selecione dois ou mais tickers com dados para calcular correlações.")
+        return
+    interval = YF_INTERVALS.get(interval, interval)
+    if janela is None:
+        matriz, titulo = correlacoes(df_precos, interval, None, metodo), f"Correlação ({metodo})"
+    else:
+        # read from the state kept up to date by update_data_frames when it covers these prices
+        matriz, ultima = correlacao_recente(df_precos, interval, janela, metodo)
+        if matriz is None:
+            st.write(f"Menos de {janela} barras no período selecionado.")
+            return
+        titulo = f"Correlação ({metodo}, últimas {janela} barras até {ultima})"
+    st.plotly_chart(grafico_correlacao(matriz, titulo), width="stretch")
+
+def show_lead_lag_table(df_precos, interval, max_lag, top=20):
+    """
+    Exibe os pares de tickers em que um antecipa o movimento do outro.
+
+    Args:
+        df_precos (DataFrame): Preços em formato longo ('symbol', 'datetime', 'close').
+        interval (str): Intervalo das barras selecionado na página, parte da chave do cache.
+        max_lag (int): Maior defasagem verificada, em barras.
+        top (int): Número de pares exibidos.
+    """
+    if df_precos is None or df_precos['symbol'].nunique() < 2:
+        return
+    pares = lead_lag(df_precos, YF_INTERVALS.get(interval, interval), max_lag, top=top)
+    if pares.empty:
+        st.write("Sem barras suficientes para identificar pares líder/seguidor.")
+        return
+    st.dataframe(pares.rename(columns={'leader': 'Líder', 'follower': 'Seguidor', 'lag': 'Defasagem (barras)',
+                                       'correlacao': 'Correlação',
+                                       'correlacao_contemporanea': 'Correlação sem defasagem'}))
+
+def analyze_trend_initiation(selected_tickers, start_date=None, end_date=None, k=1, precos=None):
     """
     Analisa o início de tendências de alta e baixa para os tickers selecionados.
 
@@ -234,50 +431,36 @@ def analyze_trend_initiation(selected_tickers, start_date, end_date):
         selected_tickers (list): Uma lista de símbolos de ticker.
         start_date (date): A data de início para a busca de dados.
         end_date (date): A data de término para a busca de dados.
+        k (int): Número de variações consecutivas no mesmo sentido que caracterizam uma tendência.
+        precos (DataFrame): Preços em formato longo ('symbol', 'datetime', 'close') a analisar no
+            lugar do download de barras de 1 minuto.
     
     Returns:
         tuple: Uma tupla contendo dois dicionários:
                - downward_trends (dict): Ticker e hora para a primeira tendência de baixa.
                - upward_trends (dict): Ticker e hora para a primeira tendência de alta.
     """
-    downward_trends = {}
-    upward_trends = {}
-
-    for ticker in selected_tickers: 
-        try: 
-            # Fetch minute-by-minute data
-            data = yf.download(ticker, start=start_date, end=end_date, interval="1m")
-
-            if data.empty:
-                st.warning(f"Não há dados de tendência para {ticker} no intervalo selecionado.")
-                continue
-
-            # Find the first downward trend
-            first_downward_trend_time = None
-            for i in range(1, len(data)):
-                if data['Close'].iloc[i] < data['Close'].iloc[i - 1]:
-                    first_downward_trend_time = data.index[i]
-                    break
-            
-            if first_downward_trend_time is not None:                
-                downward_trends[ticker] = first_downward_trend_time
-                
-                
-            # Find the first upward trend
-            first_upward_trend_time = None
-            for i in range(1, len(data)):
-                if data['Close'].iloc[i] > data['Close'].iloc[i - 1]:
-                    first_upward_trend_time = data.index[i]
-                    break
+    if precos is None:
+        # Fetch minute-by-minute data for every ticker in one request
+        precos = baixar_precos(selected_tickers, start=start_date, end=end_date, interval="1m")
+    else:
+        precos = precos[precos['symbol'].isin(selected_tickers)]
 
-            if first_upward_trend_time is not None:
-                upward_trends[ticker] = first_upward_trend_time            
+    com_dados = set(precos['symbol']) if not precos.empty else set()
+    sem_dados = [ticker for ticker in selected_tickers if ticker not in com_dados]
+    for ticker in sem_dados:
+        st.warning(f"Não há dados de tendência para {ticker} no intervalo selecionado.")
+    if len(sem_dados) == len(selected_tickers):
+        return {}, {}
 
-        except Exception as e:
-            st.error(f"Falha ao analisar tendências para {ticker}: {e}")
+    try:
+        inicios = detectar_tendencias_em_lote(precos, k)
+    except Exception as e:
+        st.error(f"Falha ao analisar tendências para {selected_tickers}: {e}")
+        return {}, {}
 
     # Format the output to display date and time
-    formatted_downward_trends = {ticker: time.strftime('%Y-%m-%d %H:%M') for ticker, time in downward_trends.items()}
-    formatted_upward_trends = {ticker: time.strftime('%Y-%m-%d %H:%M') for ticker, time in upward_trends.items()}
+    formatted_downward_trends = inicios['downward'].dropna().dt.strftime('%Y-%m-%d %H:%M').to_dict()
+    formatted_upward_trends = inicios['upward'].dropna().dt.strftime('%Y-%m-%d %H:%M').to_dict()
 
-    return formatted_downward_trends, formatted_upward_trends
\ No newline at end of file
+    return formatted_downward_trends, formatted_upward_trends
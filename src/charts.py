@@ -0,0 +1,143 @@
+from functools import lru_cache
+
+import numpy as np
+
+DEFAULT_MAX_POINTS = 2000  # per series; roughly the pixel width of a wide chart, times two
+WEBGL_MIN_POINTS = 10000  # SVG traces get sluggish past this many points on one chart
+WEBGL_MIN_SERIES = 12
+
+
+def reduzir_pontos(df, x, y, max_pontos=DEFAULT_MAX_POINTS, grupo=None):
+    """
+    Downsamples time series for plotting with min/max bucketing.
+
+    Each series is split into `max_pontos // 2` buckets of consecutive points, and only the
+    minimum and maximum of every bucket are kept, plus the first and last points. Peaks and
+    troughs therefore survive the reduction. Series that already fit are returned untouched;
+    otherwise the rows without a `y` value are dropped first, so no bucket is left without extremes.
+
+    Args:
+        df (DataFrame): The data to plot.
+        x (str): Column of the horizontal axis, used to order the points.
+        y (str): Column whose extremes are preserved.
+        max_pontos (int): Point budget per series; None disables the reduction.
+        grupo (str): Column identifying each series, e.g. 'symbol'; the whole frame is one series when None.
+
+    Returns:
+        DataFrame: The selected rows of `df`, ordered by series and `x`.
+    """
+    if max_pontos is None or df.empty:
+        return df
+    chaves = [grupo, x] if grupo is not None else [x]
+    df = df.sort_values(chaves, kind="stable").reset_index(drop=True)
+    if _tamanhos_series(df, grupo).max() <= max_pontos:
+        return df
+
+    df = df[df[y].notna()].reset_index(drop=True)
+    if df.empty:
+        return df
+    series = df.groupby(grupo, sort=False, observed=True) if grupo is not None else df.groupby(np.zeros(len(df)), sort=False)
+    tamanhos = series[y].transform("size").to_numpy()
+    posicoes = series.cumcount().to_numpy()
+    n_buckets = max(1, max_pontos // 2)
+    buckets = posicoes * n_buckets // tamanhos
+    chave_serie = df[grupo].to_numpy() if grupo is not None else np.zeros(len(df))
+    por_bucket = df[y].groupby([chave_serie, buckets], sort=False)
+
+    manter = np.zeros(len(df), dtype=bool)
+    manter[tamanhos <= max_pontos] = True  # short series are kept whole
+    manter[(posicoes == 0) | (posicoes == tamanhos - 1)] = True
+    for extremos in (por_bucket.idxmin(), por_bucket.idxmax()):
+        manter[extremos.dropna().to_numpy(dtype=np.int64)] = True
+    return df[manter].reset_index(drop=True)
+
+
+def _tamanhos_series(df, grupo):
+    """Number of points of the series each row belongs to."""
+    if grupo is None:
+        return np.full(len(df), len(df))
+    return df.groupby(grupo, sort=False, observed=True)[grupo].transform("size").to_numpy()
+
+
+def _series(df, x, y, grupo):
+    """Yields (name, x values, y values) for each series of `df`, in order of appearance."""
+    if grupo is None:
+        yield y, df[x].to_numpy(), df[y].to_numpy()
+        return
+    for nome, serie in df.groupby(grupo, sort=False, observed=True):
+        yield nome, serie[x].to_numpy(), serie[y].to_numpy()
+
+
+@lru_cache(maxsize=None)
+def template_graficos():
+    """
+    Returns the layout template shared by every chart. Built once per process, so Streamlit
+    reruns reuse it instead of resolving and merging the default template for each figure.
+    """
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    template = go.layout.Template(pio.templates["plotly"])
+    template.layout.hovermode = "x unified"
+    template.layout.legend = dict(title_text="")
+    template.layout.margin = dict(l=40, r=20, t=60, b=40)
+    return template
+
+
+def grafico_linhas(df, x, y, grupo=None, titulo=None, cores=None, max_pontos=DEFAULT_MAX_POINTS,
+                   min_pontos_webgl=WEBGL_MIN_POINTS, min_series_webgl=WEBGL_MIN_SERIES):
+    """
+    Builds a line chart of one or more time series, downsampled and rendered with WebGL when dense.
+
+    The series are reduced with `reduzir_pontos` first. When the remaining points reach
+    `min_pontos_webgl`, or there are at least `min_series_webgl` series, the traces are
+    `Scattergl` instead of SVG `Scatter`, so dense intraday views stay responsive.
+
+    Args:
+        df (DataFrame): Long-format data to plot.
+        x (str): Column of the horizontal axis.
+        y (str): Column of the values.
+        grupo (str): Column identifying each series (one trace per value); a single trace when None.
+        titulo (str): Chart title.
+        cores (list): Line colors, cycled over the series; the template colorway when None.
+        max_pontos (int): Point budget per series; None disables the reduction.
+        min_pontos_webgl (int): Total points from which WebGL traces are used.
+        min_series_webgl (int): Number of series from which WebGL traces are used.
+
+    Returns:
+        Figure: The Plotly figure.
+    """
+    import plotly.graph_objects as go
+
+    df = reduzir_pontos(df, x, y, max_pontos, grupo)
+    n_series = df[grupo].nunique() if grupo is not None else 1
+    webgl = len(df) >= min_pontos_webgl or n_series >= min_series_webgl
+    trace = go.Scattergl if webgl else go.Scatter
+
+    fig = go.Figure(layout=dict(template=template_graficos(), title=titulo, xaxis_title=x, yaxis_title=y,
+                                showlegend=grupo is not None))
+    for i, (nome, xs, ys) in enumerate(_series(df, x, y, grupo)):
+        linha = dict(color=cores[i % len(cores)]) if cores else None
+        fig.add_trace(trace(x=xs, y=ys, mode="lines", name=str(nome), line=linha))
+    return fig
+
+
+def grafico_correlacao(matriz, titulo=None):
+    """
+    Builds a heatmap of a correlation matrix, on a diverging scale fixed to [-1, 1].
+
+    Args:
+        matriz (DataFrame): Square correlation matrix, indexed and labelled by symbol.
+        titulo (str): Chart title.
+
+    Returns:
+        Figure: The Plotly figure.
+    """
+    import plotly.graph_objects as go
+
+    fig = go.Figure(layout=dict(template=template_graficos(), title=titulo, hovermode="closest"))
+    fig.add_trace(go.Heatmap(z=matriz.to_numpy(), x=[str(c) for c in matriz.columns],
+                             y=[str(i) for i in matriz.index], zmin=-1, zmax=1, colorscale="RdBu",
+                             reversescale=True))
+    fig.update_yaxes(autorange="reversed")
+    return fig
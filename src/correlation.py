@@ -0,0 +1,495 @@
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from analitics import OUTPUT_DIR, matriz_fechamentos
+from timing import cronometrado, registrar_cache
+
+CORRELATION_METHODS = ("pearson", "spearman")
+CORRELATION_CACHE_ENTRIES = 16  # computed matrices kept per process
+MIN_PERIODS = 10  # overlapping returns needed before a pair's correlation is reported
+LEAD_LAG_MAX = 60  # largest lag scanned, in bars
+ONLINE_WINDOW = 60  # returns in the window kept up to date by update_data_frames
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def matriz_retornos(precos):
+    """
+    Builds the log-returns matrix of long-format prices.
+
+    Closes are not carried forward, so a missing bar yields NaN returns instead of a spurious zero.
+
+    Args:
+        precos (DataFrame): Prices with 'symbol', 'datetime' and 'close' columns.
+
+    Returns:
+        DataFrame: Indexed by datetime (from the second bar on), with one column per symbol.
+    """
+    fechamentos = matriz_fechamentos(precos, preencher=False)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        retornos = np.diff(np.log(fechamentos.to_numpy(dtype=float)), axis=0)
+    return pd.DataFrame(retornos, index=fechamentos.index[1:], columns=fechamentos.columns)
+
+
+def _ranquear(retornos):
+    """Replaces each column by the ranks of its valid values, for the Spearman correlation."""
+    return retornos.rank(axis=0, method="average", na_option="keep").to_numpy(dtype=float)
+
+
+def _somas_pareadas(valores):
+    """
+    Pairwise counts, sums, sums of squares and cross-products of the columns of `valores`,
+    over the rows where both columns of a pair are valid.
+
+    Each is one matrix product of the zero-filled values with the validity mask, so all
+    N x N pairs come out together. `somas[i, j]` is the sum of column i where j is also valid.
+    """
+    validos = ~np.isnan(valores)
+    zerados = np.where(validos, valores, 0.0)
+    mascara = validos.astype(float)
+    return mascara.T @ mascara, zerados.T @ mascara, (zerados * zerados).T @ mascara, zerados.T @ zerados
+
+
+def _correlacao_de_somas(n, somas, quadrados, cruzados, min_periodos):
+    """Pearson correlation of every pair from the sums of `_somas_pareadas`."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariancia = cruzados - somas * somas.T / n
+        variancias = quadrados - somas * somas / n
+        correlacao = covariancia / np.sqrt(variancias * variancias.T)
+    correlacao[n < min_periodos] = np.nan
+    return np.clip(correlacao, -1.0, 1.0)
+
+
+def _pearson_mascarado(valores, min_periodos):
+    """Pearson correlation of every pair of columns over the rows where both are valid."""
+    return _correlacao_de_somas(*_somas_pareadas(valores), min_periodos)
+
+
+def correlacao(retornos, metodo="pearson", min_periodos=MIN_PERIODS):
+    """
+    Computes the correlation of every pair of symbols in a returns matrix.
+
+    Args:
+        retornos (DataFrame): Returns indexed by datetime, one column per symbol, as returned
+            by `matriz_retornos`. NaNs are excluded pairwise.
+        metodo (str): "pearson", or "spearman" for the correlation of the ranks. Each column is
+            ranked once over all its valid returns, not over each pair's overlap, so with gaps the
+            result differs slightly from `DataFrame.corr("spearman")`; without gaps they agree.
+        min_periodos (int): Overlapping returns a pair needs; its correlation is NaN below that.
+
+    Returns:
+        DataFrame: The symmetric N x N correlation matrix, indexed and labelled by symbol.
+    """
+    if metodo not in CORRELATION_METHODS:
+        raise ValueError(f"Unknown correlation method {metodo!r}; expected one of {CORRELATION_METHODS}")
+    valores = _ranquear(retornos) if metodo == "spearman" else retornos.to_numpy(dtype=float)
+    return pd.DataFrame(_pearson_mascarado(valores, min_periodos), index=retornos.columns,
+                        columns=retornos.columns)
+
+
+def correlacao_movel(retornos, janela, metodo="pearson", passo=1, min_periodos=MIN_PERIODS):
+    """
+    Computes the correlation matrix over a rolling window of returns.
+
+    Args:
+        retornos (DataFrame): Returns indexed by datetime, one column per symbol.
+        janela (int): Number of returns in each window.
+        metodo (str): "pearson" or "spearman"; Spearman ranks within each window.
+        passo (int): Bars between consecutive window ends; 1 evaluates every bar.
+        min_periodos (int): Overlapping returns a pair needs within the window.
+
+    Returns:
+        DataFrame: Indexed by (datetime, symbol) with one column per symbol, like
+                   `DataFrame.rolling(janela).corr()`; one N x N block per window end.
+    """
+    if metodo not in CORRELATION_METHODS:
+        raise ValueError(f"Unknown correlation method {metodo!r}; expected one of {CORRELATION_METHODS}")
+    simbolos = retornos.columns
+    fins = np.arange(len(retornos) - 1, janela - 2, -passo)[::-1]  # last window ends at the latest bar
+    valores = retornos.to_numpy(dtype=float)
+
+    blocos = []
+    for fim in fins:
+        inicio = fim - janela + 1
+        if metodo == "spearman":
+            blocos.append(_pearson_mascarado(_ranquear(retornos.iloc[inicio:fim + 1]), min_periodos))
+        else:
+            blocos.append(_pearson_mascarado(valores[inicio:fim + 1], min_periodos))
+
+    indice = pd.MultiIndex.from_product([retornos.index[fins], simbolos], names=[retornos.index.name, simbolos.name])
+    dados = np.concatenate(blocos) if blocos else np.empty((0, len(simbolos)))
+    return pd.DataFrame(dados, index=indice, columns=simbolos)
+
+
+def _versao_precos(precos):
+    """
+    Cheap fingerprint of a price frame: its size and its latest bar, which change as bars are added,
+    and a hash of each symbol's last close, which changes when the incremental refresh rewrites the
+    last, partial bar in place.
+    """
+    if precos.empty:
+        return 0, None, None
+    ultimos = precos.groupby('symbol', sort=False, observed=True)['close'].last()
+    return len(precos), str(precos['datetime'].max()), int(pd.util.hash_pandas_object(ultimos).sum())
+
+
+def _universo(precos):
+    """The sorted symbols of a price frame, which identify its universe in the cache keys."""
+    return tuple(sorted(precos['symbol'].unique())) if not precos.empty else ()
+
+
+def _memoizar(chave, calcular):
+    """Returns the cached result for `chave`, computing and storing it with `calcular()` on a miss."""
+    with _cache_lock:
+        if chave in _cache:
+            _cache.move_to_end(chave)
+            registrar_cache(acertos=1)
+            return _cache[chave]
+    registrar_cache(falhas=1)
+    resultado = calcular()
+    with _cache_lock:
+        _cache[chave] = resultado
+        while len(_cache) > CORRELATION_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return resultado
+
+
+@cronometrado()
+def correlacoes(precos, intervalo, janela=None, metodo="pearson", passo=1, min_periodos=MIN_PERIODS):
+    """
+    Returns the correlations of a universe of symbols, memoized across Streamlit reruns.
+
+    Results are cached per universe (the sorted symbols), interval, window, method and price
+    version, so a rerun over unchanged prices reuses the matrix and new bars recompute it.
+
+    Args:
+        precos (DataFrame): Long-format prices ('symbol', 'datetime', 'close'), e.g. the cached
+            `precos_intradiarios` frame or a price store query.
+        intervalo (str): Bar interval of `precos`, e.g. "1d"; part of the cache key.
+        janela (int): Rolling window in returns; the whole period when None.
+        metodo (str): "pearson" or "spearman".
+        passo (int): Bars between consecutive window ends of a rolling correlation.
+        min_periodos (int): Overlapping returns a pair needs.
+
+    Returns:
+        DataFrame: The N x N matrix, or the rolling frame of `correlacao_movel` when `janela` is set.
+    """
+    universo = _universo(precos)
+    chave = ("correlacao", universo, intervalo, janela, metodo, passo, min_periodos, _versao_precos(precos))
+
+    def calcular():
+        logging.info("Computing %s correlations of %s symbols (%s, window %s)", metodo, len(universo), intervalo, janela)
+        retornos = matriz_retornos(precos)
+        if janela is None:
+            return correlacao(retornos, metodo, min_periodos)
+        return correlacao_movel(retornos, janela, metodo, passo, min_periodos)
+
+    return _memoizar(chave, calcular)
+
+
+def correlacao_defasada(retornos, max_lag, min_periodos=MIN_PERIODS):
+    """
+    Computes the cross-correlation of every pair of symbols at lags 0 to `max_lag`.
+
+    Each column is standardized over its valid returns and zero-filled, so the correlation at
+    lag l is one matrix product of the matrix with itself shifted by l, divided by the number of
+    overlapping valid returns. Negative lags are the transposes: `C[-l] = C[l].T`.
+
+    Args:
+        retornos (DataFrame): Returns indexed by datetime, one column per symbol.
+        max_lag (int): Largest lag, in bars.
+        min_periodos (int): Overlapping returns a pair needs at a lag; NaN below that.
+
+    Returns:
+        ndarray: Shape (max_lag + 1, N, N); `[l, i, j]` correlates symbol i at t with symbol j at t + l.
+    """
+    valores = retornos.to_numpy(dtype=float)
+    validos = ~np.isnan(valores)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        padronizados = (valores - np.nanmean(valores, axis=0)) / np.nanstd(valores, axis=0)
+    padronizados = np.where(validos, padronizados, 0.0)
+    mascara = validos.astype(float)
+
+    n_bars, n_simbolos = valores.shape
+    resultado = np.full((max_lag + 1, n_simbolos, n_simbolos), np.nan)
+    for lag in range(min(max_lag, n_bars - 1) + 1):
+        fim = n_bars - lag
+        sobreposicao = mascara[:fim].T @ mascara[lag:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            resultado[lag] = padronizados[:fim].T @ padronizados[lag:] / sobreposicao
+        resultado[lag][sobreposicao < min_periodos] = np.nan
+    return np.clip(resultado, -1.0, 1.0)
+
+
+def varrer_lead_lag(retornos, max_lag=LEAD_LAG_MAX, min_periodos=MIN_PERIODS, top=None):
+    """
+    Ranks the ordered pairs of symbols where one leads the other.
+
+    For every pair (leader, follower) the lag between 1 and `max_lag` with the strongest
+    correlation between the leader's returns and the follower's later returns is picked, and
+    the pairs are ranked by its absolute value.
+
+    Args:
+        retornos (DataFrame): Returns indexed by datetime, one column per symbol.
+        max_lag (int): Largest lag scanned, in bars.
+        min_periodos (int): Overlapping returns a pair needs at a lag.
+        top (int): Number of pairs returned; all when None.
+
+    Returns:
+        DataFrame: Columns 'leader', 'follower', 'lag' (bars), 'correlacao' (at that lag) and
+                   'correlacao_contemporanea' (at lag 0), strongest first.
+    """
+    colunas = ['leader', 'follower', 'lag', 'correlacao', 'correlacao_contemporanea']
+    defasadas = correlacao_defasada(retornos, max_lag, min_periodos)
+    if max_lag < 1 or defasadas.shape[1] < 2:
+        return pd.DataFrame(columns=colunas)
+
+    positivas = np.abs(np.nan_to_num(defasadas[1:], nan=0.0))
+    melhores = positivas.argmax(axis=0)  # [i, j]: index into lags 1..max_lag
+    lideres, seguidores = np.nonzero(~np.eye(defasadas.shape[1], dtype=bool))
+    lags = melhores[lideres, seguidores] + 1
+    tabela = pd.DataFrame({
+        'leader': retornos.columns[lideres],
+        'follower': retornos.columns[seguidores],
+        'lag': lags,
+        'correlacao': defasadas[lags, lideres, seguidores],
+        'correlacao_contemporanea': defasadas[0, lideres, seguidores],
+    }, columns=colunas).dropna(subset=['correlacao'])
+    tabela = tabela.iloc[np.argsort(-tabela['correlacao'].abs().to_numpy(), kind="stable")].reset_index(drop=True)
+    return tabela.head(top) if top is not None else tabela
+
+
+@cronometrado()
+def lead_lag(precos, intervalo, max_lag=LEAD_LAG_MAX, min_periodos=MIN_PERIODS, top=None):
+    """
+    Returns the ranked leader/follower pairs of a universe, memoized like `correlacoes`.
+
+    Args:
+        precos (DataFrame): Long-format prices ('symbol', 'datetime', 'close').
+        intervalo (str): Bar interval of `precos`; part of the cache key.
+        max_lag, min_periodos, top: See `varrer_lead_lag`.
+
+    Returns:
+        DataFrame: The table of `varrer_lead_lag`.
+    """
+    universo = _universo(precos)
+    chave = ("lead_lag", universo, intervalo, max_lag, min_periodos, top, _versao_precos(precos))
+
+    def calcular():
+        logging.info("Scanning lead-lag of %s symbols up to %s bars (%s)", len(universo), max_lag, intervalo)
+        return varrer_lead_lag(matriz_retornos(precos), max_lag, min_periodos, top)
+
+    return _memoizar(chave, calcular)
+
+
+def _caminho_estado(intervalo, janela):
+    """Path of the persisted online correlation state, next to the price caches."""
+    return os.path.join(OUTPUT_DIR, f"correlacao_{intervalo}_{janela}.npz")
+
+
+def iniciar_correlacao_online(simbolos, janela):
+    """
+    Creates an empty online rolling-correlation state.
+
+    The state holds the last `janela` returns in a ring buffer together with their pairwise
+    counts, sums, sums of squares and cross-products, so adding a bar costs O(N^2) instead of
+    recomputing the window.
+
+    Args:
+        simbolos (list): Symbols of the universe, in column order.
+        janela (int): Number of returns in the window.
+
+    Returns:
+        dict: The state, to be fed with `adicionar_barra`.
+    """
+    n_simbolos = len(simbolos)
+    return {
+        "simbolos": np.asarray(simbolos, dtype=str),
+        "janela": janela,
+        "buffer": np.full((janela, n_simbolos), np.nan),
+        "posicao": 0,
+        "preenchidas": 0,
+        "atualizacoes": 0,
+        "ultimos": np.full(n_simbolos, np.nan),
+        "ultimo_datetime": "",
+        **dict(zip(("n", "somas", "quadrados", "cruzados"), _somas_pareadas(np.empty((0, n_simbolos))))),
+    }
+
+
+def _acumular(estado, retornos, sinal):
+    """Adds (`sinal` = 1) or removes (`sinal` = -1) one row of returns from the running sums."""
+    validos = ~np.isnan(retornos)
+    zerados = np.where(validos, retornos, 0.0)
+    mascara = validos.astype(float)
+    estado["n"] += sinal * np.outer(mascara, mascara)
+    estado["somas"] += sinal * np.outer(zerados, mascara)
+    estado["quadrados"] += sinal * np.outer(zerados * zerados, mascara)
+    estado["cruzados"] += sinal * np.outer(zerados, zerados)
+
+
+def adicionar_barra(estado, datahora, fechamentos):
+    """
+    Adds one bar to an online correlation state, evicting the oldest return once the window is full.
+
+    Every `janela` bars the sums are recomputed from the buffer, which bounds the floating-point
+    drift of the running additions and subtractions at an amortized O(N^2) per bar.
+
+    Args:
+        estado (dict): State from `iniciar_correlacao_online`.
+        datahora: Datetime of the bar.
+        fechamentos (array-like): Closes aligned with the state's symbols; NaN for a symbol
+            without this bar, which gives it NaN returns here and on its next bar, as in
+            `matriz_retornos`.
+    """
+    fechamentos = np.asarray(fechamentos, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        retornos = np.log(fechamentos / estado["ultimos"])
+    estado["ultimos"] = fechamentos
+    estado["ultimo_datetime"] = str(datahora)
+
+    posicao = int(estado["posicao"])
+    if estado["preenchidas"] == estado["janela"]:
+        _acumular(estado, estado["buffer"][posicao], -1)
+    estado["buffer"][posicao] = retornos
+    _acumular(estado, retornos, 1)
+    estado["posicao"] = (posicao + 1) % estado["janela"]
+    estado["preenchidas"] = min(int(estado["preenchidas"]) + 1, estado["janela"])
+
+    estado["atualizacoes"] = int(estado["atualizacoes"]) + 1
+    if estado["atualizacoes"] >= estado["janela"]:
+        estado["n"], estado["somas"], estado["quadrados"], estado["cruzados"] = _somas_pareadas(estado["buffer"])
+        estado["atualizacoes"] = 0
+
+
+def correlacao_online(estado, min_periodos=MIN_PERIODS):
+    """Returns the N x N correlation matrix of the window held by an online state."""
+    simbolos = pd.Index(estado["simbolos"], name="symbol")
+    matriz = _correlacao_de_somas(estado["n"], estado["somas"], estado["quadrados"], estado["cruzados"],
+                                  min_periodos)
+    return pd.DataFrame(matriz, index=simbolos, columns=simbolos)
+
+
+def salvar_correlacao_online(estado, caminho):
+    """Writes an online correlation state atomically."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    # a unique temporary file per write, since every session refreshing the prices writes the state
+    descritor, temporario = tempfile.mkstemp(prefix=f".{os.path.basename(caminho)}.", suffix=".npz",
+                                             dir=os.path.dirname(caminho) or ".")
+    try:
+        with os.fdopen(descritor, "wb") as arquivo:
+            np.savez(arquivo, **{chave: np.asarray(valor) for chave, valor in estado.items()})
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def carregar_correlacao_online(caminho):
+    """Reads an online correlation state, returning None if it is missing or unreadable."""
+    try:
+        with np.load(caminho, allow_pickle=False) as arquivo:
+            estado = {chave: arquivo[chave] for chave in arquivo.files}
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning("Ignoring unreadable correlation state %s: %s", caminho, e)
+        return None
+    for chave in ("janela", "posicao", "preenchidas", "atualizacoes"):
+        estado[chave] = int(estado[chave])
+    estado["ultimo_datetime"] = str(estado["ultimo_datetime"])
+    return estado
+
+
+@cronometrado()
+def atualizar_correlacao_online(precos, intervalo, janela=ONLINE_WINDOW, caminho=None):
+    """
+    Brings the persisted rolling correlation of a price frame up to date, bar by bar.
+
+    Only the bars newer than the state's last bar are added. The newest bar of `precos` is left
+    out, since the incremental refresh may still rewrite it. A missing or unreadable state, or
+    one for a different universe or window, is rebuilt from the last `janela` bars.
+
+    Args:
+        precos (DataFrame): Long-format prices ('symbol', 'datetime', 'close').
+        intervalo (str): Bar interval of `precos`; part of the state's file name.
+        janela (int): Number of returns in the window.
+        caminho (str): Path of the state file; next to the price caches when None.
+
+    Returns:
+        DataFrame: The N x N correlation matrix of the latest complete window.
+    """
+    caminho = caminho or _caminho_estado(intervalo, janela)
+    fechamentos = matriz_fechamentos(precos, preencher=False).iloc[:-1]
+    simbolos = [str(simbolo) for simbolo in fechamentos.columns]
+
+    estado = carregar_correlacao_online(caminho)
+    if estado is None or estado["janela"] != janela or estado["simbolos"].tolist() != simbolos:
+        logging.info("Rebuilding %s online correlation state for %s symbols", intervalo, len(simbolos))
+        estado = iniciar_correlacao_online(simbolos, janela)
+        novos = fechamentos.iloc[-(janela + 1):]  # older returns would leave the window anyway
+    else:
+        novos = fechamentos[fechamentos.index.astype(str) > estado["ultimo_datetime"]]
+
+    for datahora, linha in zip(novos.index, novos.to_numpy(dtype=float)):
+        adicionar_barra(estado, datahora, linha)
+    if len(novos):
+        logging.info("Added %s bars to the %s online correlation state", len(novos), intervalo)
+        try:
+            salvar_correlacao_online(estado, caminho)
+        except OSError as e:
+            logging.warning("Could not write correlation state %s: %s", caminho, e)
+    return correlacao_online(estado)
+
+
+@cronometrado()
+def correlacao_recente(precos, intervalo, janela, metodo="pearson", min_periodos=MIN_PERIODS, caminho=None):
+    """
+    Returns the correlation matrix of the latest `janela` returns of a universe.
+
+    Pearson matrices are read from the online state kept by `atualizar_correlacao_online` when it
+    holds every symbol of `precos` and is up to date with them (its window ends at the bar before
+    the newest, which the refresh may still rewrite). Otherwise, and for Spearman, the last
+    `janela` returns are correlated, memoized like `correlacoes`.
+
+    Args:
+        precos (DataFrame): Long-format prices ('symbol', 'datetime', 'close').
+        intervalo (str): Bar interval of `precos`; part of the state's file name and the cache key.
+        janela (int): Number of returns in the window.
+        metodo (str): "pearson" or "spearman".
+        min_periodos (int): Overlapping returns a pair needs within the window.
+        caminho (str): Path of the online state file; next to the price caches when None.
+
+    Returns:
+        tuple: The N x N matrix and the datetime of the window's last bar, or (None, None) when
+               `precos` has fewer than `janela` returns.
+    """
+    universo = _universo(precos)
+    if metodo == "pearson" and universo:
+        estado = carregar_correlacao_online(caminho or _caminho_estado(intervalo, janela))
+        datas = np.sort(precos['datetime'].unique())
+        if (estado is not None and estado["janela"] == janela and len(datas) > 1
+                and estado["ultimo_datetime"] == str(pd.Timestamp(datas[-2]))
+                and set(universo) <= set(estado["simbolos"].tolist())):
+            registrar_cache(acertos=1)
+            matriz = correlacao_online(estado, min_periodos).loc[list(universo), list(universo)]
+            return matriz, pd.Timestamp(datas[-2])
+
+    chave = ("correlacao_recente", universo, intervalo, janela, metodo, min_periodos, _versao_precos(precos))
+
+    def calcular():
+        logging.info("Computing %s correlations of the last %s returns of %s symbols (%s)", metodo, janela,
+                     len(universo), intervalo)
+        retornos = matriz_retornos(precos)
+        if len(retornos) < janela:
+            return None, None
+        return correlacao(retornos.iloc[-janela:], metodo, min_periodos), retornos.index[-1]
+
+    return _memoizar(chave, calcular)
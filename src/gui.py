@@ -1,18 +1,27 @@
 import streamlit as st
-from app import *
-from analitics import analyze_trend_initiation, get_company_data
+from app import (company_data, display_intraday_prices_table, display_top_15_table, invalidate_data_cache,
+                 load_data, load_price_history, show_company_info, show_comparative_graph, show_correlation_heatmap,
+                 show_graph_selected_tickers, show_lead_lag_table, snapshot_prices, update_data_frames)
+from analitics import (OUTPUT_FILE_INTRADAY, analyze_trend_initiation, iniciar_ciclo_requisicoes, juntar_industry,
+                       ler_cache)
+from logging_setup import configurar_logging
+from timing import limpar_medicoes, relatorio, relatorio_json
 import pandas as pd
 from datetime import date
-import yfinance as yf
 
 st.set_page_config(layout="wide")
+configurar_logging()
+iniciar_ciclo_requisicoes()  # each render fetches a (ticker, range, interval) at most once
 
 def format_number(number):
     if isinstance(number, float):
         return "{:.2f}".format(number)
     return number
 
-page = st.sidebar.radio("Navegar para:", ["Principal", "Comparativo", "Gráfico", "Tabela"])
+pages = ["Principal", "Comparativo", "Gráfico", "Correlação", "Tabela"]
+if "diagnostico" in st.query_params:  # hidden page, opened with ?diagnostico
+    pages.append("Diagnóstico")
+page = st.sidebar.radio("Navegar para:", pages)
 
 
 end_date = date.today()
@@ -48,7 +57,7 @@ if page == "Principal":
 
 elif page == "Comparativo":
     st.title("Comparativo")
-    data_frame_top_15_industry, _, _ = load_data()
+    data_frame_top_15_industry, _, _ = load_data(colunas_industry=["TckrSymb"], colunas_precos=["symbol"])
     
     if isinstance(data_frame_top_15_industry, pd.DataFrame):
         tickers_list = data_frame_top_15_industry['TckrSymb'].tolist()
@@ -66,13 +75,14 @@ elif page == "Comparativo":
         show_comparative_graph(selected_tickers, start_date, end_date)
 
         for ticker in selected_tickers:
-          company_data = get_company_data(ticker, start_date, end_date)
-          company_data_list.append(company_data)
+          company_data_list.append(company_data(ticker, start_date, end_date))
         
-        for ticker, company_data in zip(selected_tickers, company_data_list):
-           show_company_info(company_data, ticker)
+        for ticker, dados_empresa in zip(selected_tickers, company_data_list):
+           if ticker != "BOVA11.SA":  # already shown by show_comparative_graph
+               show_company_info(dados_empresa, ticker)
         
-        downward_trends, upward_trends = analyze_trend_initiation(selected_tickers, start_date, end_date)    
+        downward_trends, upward_trends = analyze_trend_initiation(selected_tickers, start_date, end_date,
+                                                                  precos=snapshot_prices(selected_tickers, start_date, end_date))    
         if downward_trends:
             for ticker, trend_time in downward_trends.items():
                 st.write(f"**Primeira Tendência de Baixa Iniciada:** {ticker} em {trend_time}")
@@ -102,13 +112,41 @@ elif page == "Gráfico":
         selected_tickers = st.multiselect("Selecione os Tickers", tickers_list, key="grafico_tickers")
 
         if selected_tickers:
-            graph_data = data_frame_precos_intradiarios[data_frame_precos_intradiarios['symbol'].isin(selected_tickers)]
+            graph_data = load_price_history(selected_tickers, interval, period)
+            if graph_data.empty:
+                graph_data = data_frame_precos_intradiarios[data_frame_precos_intradiarios['symbol'].isin(selected_tickers)]
             show_graph_selected_tickers(graph_data, selected_tickers)
         else:
             st.write("Selecione pelo menos um ticker para exibir o gráfico.")
     else:
         st.write("Não foi possível carregar os dados dos tickers.")        
     
+elif page == "Correlação":
+    st.title("Correlação entre Ações")
+
+    interval_options = ["1min", "2min", "5min", "15min", "30min", "60min", "90min", "1h", "1d"]
+    period_options = ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max"]
+
+    interval = st.selectbox("Selecione o Intervalo", interval_options, index=8, key="correlacao_intervalo")
+    period = st.selectbox("Selecione o Período", period_options, index=5, key="correlacao_periodo")
+    metodo = st.selectbox("Método", ["pearson", "spearman"])
+    janela = st.number_input("Janela móvel (barras, 0 para o período inteiro)", min_value=0, value=0, step=5)
+
+    data_frame_top_15_industry, data_frame_precos_intradiarios, tickers_top_15 = load_data(interval, period)
+
+    if isinstance(data_frame_top_15_industry, pd.DataFrame):
+        correlation_data = load_price_history(data_frame_top_15_industry['TckrSymb'].tolist(), interval, period,
+                                              colunas=["symbol", "datetime", "close"])
+        if correlation_data.empty:
+            correlation_data = data_frame_precos_intradiarios
+        show_correlation_heatmap(correlation_data, interval, int(janela) or None, metodo)
+
+        st.subheader("Pares Líder/Seguidor")
+        max_lag = st.slider("Defasagem máxima (barras)", min_value=1, max_value=120, value=20)
+        show_lead_lag_table(correlation_data, interval, max_lag)
+    else:
+        st.write("Não foi possível carregar os dados dos tickers.")
+
 elif page == "Tabela":
     st.title("Tabelas de Dados")
 
@@ -126,7 +164,8 @@ elif page == "Tabela":
             try:
                 with st.spinner("Atualizando..."):
                     data_frame_precos_intradiarios = update_data_frames(tickers_top_15, interval, period)
-                data_frame_precos_intradiarios = pd.read_csv("src/precos_intradiarios_top_15.csv")
+                invalidate_data_cache()
+                data_frame_precos_intradiarios = ler_cache(OUTPUT_FILE_INTRADAY)
                 tickers_top_15 = data_frame_precos_intradiarios["symbol"].unique().tolist()                
             except Exception as e:
                 st.error(f"Ops, houve um erro ao atualizar: {e}")
@@ -138,4 +177,15 @@ elif page == "Tabela":
 
     if isinstance(data_frame_precos_intradiarios, pd.DataFrame):
         st.subheader("Preços no período selecionado")
+        if isinstance(data_frame_top_15_industry, pd.DataFrame) and 'Industry' in data_frame_top_15_industry.columns:
+            data_frame_precos_intradiarios = juntar_industry(data_frame_precos_intradiarios, data_frame_top_15_industry)
         display_intraday_prices_table(data_frame_precos_intradiarios)
+
+elif page == "Diagnóstico":
+    st.title("Diagnóstico")
+    st.write("Latência por estágio da camada de dados, desde o início do processo.")
+    st.dataframe(relatorio())
+    st.download_button("Baixar JSON", relatorio_json(), file_name="latencias.json", mime="application/json")
+    if st.button("Limpar medições"):
+        limpar_medicoes()
+        st.rerun()
@@ -0,0 +1,47 @@
+"""
+Logging configuration shared by every module, read once from the `[logger]` table of config.toml.
+"""
+import logging
+import os
+import tomllib
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.toml")
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DEFAULT_LEVEL = "info"
+# Libraries whose DEBUG output would drown the app's own; they never log below WARNING
+QUIET_LOGGERS = ("urllib3", "yfinance", "peewee")
+
+
+def _nivel_configurado(caminho):
+    """Reads `[logger] level` from a TOML file, falling back to DEFAULT_LEVEL if it is missing or invalid."""
+    try:
+        with open(caminho, "rb") as arquivo:
+            nivel = tomllib.load(arquivo).get("logger", {}).get("level", DEFAULT_LEVEL)
+    except FileNotFoundError:
+        return DEFAULT_LEVEL
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        logging.getLogger(__name__).warning("Ignoring unreadable logging config %s: %s", caminho, e)
+        return DEFAULT_LEVEL
+    return str(nivel)
+
+
+def configurar_logging(caminho=CONFIG_FILE):
+    """
+    Configures the root logger with the level of config.toml, keeping `QUIET_LOGGERS` at WARNING.
+    Called by the entry points, gui.py and the refresher, never on import; only the first call has
+    an effect, so Streamlit reruns keep it.
+
+    Returns:
+        int: The effective root level.
+    """
+    raiz = logging.getLogger()
+    if not raiz.handlers:
+        nome = _nivel_configurado(caminho).upper()
+        nivel = logging.getLevelName(nome)
+        if not isinstance(nivel, int):
+            logging.getLogger(__name__).warning("Unknown log level %r in %s; using %s", nome, caminho, DEFAULT_LEVEL)
+            nivel = logging.getLevelName(DEFAULT_LEVEL.upper())
+        logging.basicConfig(level=nivel, format=LOG_FORMAT)
+        for nome_logger in QUIET_LOGGERS:
+            logging.getLogger(nome_logger).setLevel(max(nivel, logging.WARNING))
+    return raiz.getEffectiveLevel()
@@ -0,0 +1,199 @@
+import logging
+import os
+import sqlite3
+
+import pandas as pd
+
+STORE_FILE = os.path.join("src", "precos.sqlite")
+STORE_COLUMNS = ["datetime", "symbol", "volume", "open", "high", "low", "close"]
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # fixed width, so text order is time order
+COMPACT_PRICE_COLUMNS = ["open", "high", "low", "close"]  # float32 keeps ~7 significant digits, ample for B3 quotes
+
+# Each (symbol, interval) pair is a partition of the primary key, and bars are clustered by it
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    datetime TEXT NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume REAL,
+    PRIMARY KEY (symbol, interval, datetime)
+) WITHOUT ROWID
+"""
+
+_UPSERT = """
+INSERT INTO prices (symbol, interval, datetime, open, high, low, close, volume)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (symbol, interval, datetime) DO UPDATE SET
+    open = excluded.open, high = excluded.high, low = excluded.low,
+    close = excluded.close, volume = excluded.volume
+"""
+
+_PERIOD_OFFSETS = {
+    "d": lambda n: pd.DateOffset(days=n),
+    "wk": lambda n: pd.DateOffset(weeks=n),
+    "mo": lambda n: pd.DateOffset(months=n),
+    "y": lambda n: pd.DateOffset(years=n),
+}
+
+
+def _conectar(caminho):
+    """Opens the store, creating its directory and the prices table on first use."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    conexao = sqlite3.connect(caminho, timeout=30)
+    conexao.execute(_SCHEMA)
+    return conexao
+
+
+def _formatar_datetimes(datas):
+    """Formats datetimes as fixed-width text, dropping any timezone but keeping the local wall time."""
+    datas = pd.to_datetime(datas)
+    if datas.dt.tz is not None:
+        datas = datas.dt.tz_localize(None)
+    return datas.dt.strftime(DATETIME_FORMAT)
+
+
+def inicio_do_periodo(periodo, agora=None):
+    """
+    Converts a yfinance period string ("5d", "1mo", "1y", "ytd", "max", ...) to its start datetime.
+
+    Args:
+        periodo (str): The period.
+        agora (datetime): Time the period is counted back from; the active provider's
+            `agora()` when None, so a replayed market resolves periods on its own clock.
+
+    Returns:
+        Timestamp: The start of the period, or None for "max".
+    """
+    if agora is None:
+        from providers import provedor_atual  # providers imports this module
+
+        agora = provedor_atual().agora()
+    agora = pd.Timestamp(agora)
+    if periodo == "max":
+        return None
+    if periodo == "ytd":
+        return pd.Timestamp(year=agora.year, month=1, day=1)
+    for sufixo, deslocamento in _PERIOD_OFFSETS.items():
+        if periodo.endswith(sufixo) and periodo[:-len(sufixo)].isdigit():
+            return (agora - deslocamento(int(periodo[:-len(sufixo)]))).normalize()
+    raise ValueError(f"Unknown period {periodo!r}")
+
+
+def compactar_precos(precos):
+    """
+    Converts long-format prices to their compact in-memory layout.
+
+    'symbol' becomes categorical, the OHLC prices float32 and the volume uint32 when every value is
+    a whole number that fits, halving the numeric columns and replacing the repeated symbol strings
+    by small integer codes. Missing columns are skipped.
+
+    Args:
+        precos (DataFrame): Prices in the long schema.
+
+    Returns:
+        DataFrame: The same prices with compact column types.
+    """
+    tipos = {coluna: "float32" for coluna in COMPACT_PRICE_COLUMNS if coluna in precos.columns}
+    if "symbol" in precos.columns:
+        tipos["symbol"] = "category"
+    if "volume" in precos.columns and not precos.empty:
+        volume = precos["volume"]
+        if volume.notna().all() and volume.min() >= 0 and volume.max() < 2 ** 32 and (volume % 1 == 0).all():
+            tipos["volume"] = "uint32"
+    return precos.astype(tipos)
+
+
+def gravar_precos(precos, intervalo, caminho=STORE_FILE):
+    """
+    Appends bars to the store. A bar already stored for the same (symbol, interval, datetime)
+    is overwritten, so a refreshed, previously partial bar replaces the old one.
+
+    Args:
+        precos (DataFrame): Prices with columns `datetime, symbol, volume, open, high, low, close`.
+        intervalo (str): The bar interval of `precos` (e.g. "15m", "1d").
+        caminho (str): Path of the SQLite store.
+
+    Returns:
+        int: Number of bars written.
+    """
+    if precos is None or precos.empty:
+        return 0
+    linhas = pd.DataFrame({
+        "symbol": precos["symbol"].astype(str),
+        "interval": intervalo,
+        "datetime": _formatar_datetimes(precos["datetime"]),
+        "open": precos["open"].astype(float),
+        "high": precos["high"].astype(float),
+        "low": precos["low"].astype(float),
+        "close": precos["close"].astype(float),
+        "volume": precos["volume"].astype(float),
+    })
+    with _conectar(caminho) as conexao:
+        conexao.executemany(_UPSERT, linhas.itertuples(index=False, name=None))
+    logging.info("Stored %s %s bars in %s", len(linhas), intervalo, caminho)
+    return len(linhas)
+
+
+def consultar_precos(simbolos=None, intervalo="1d", inicio=None, fim=None, colunas=None, caminho=STORE_FILE):
+    """
+    Reads a range of bars from the store.
+
+    Args:
+        simbolos (list): Symbols to read; all stored symbols when None.
+        intervalo (str): The bar interval to read.
+        inicio (datetime): Inclusive start of the range; unbounded when None.
+        fim (datetime): Exclusive end of the range; unbounded when None.
+        colunas (list): Columns to return, out of `STORE_COLUMNS`; all when None.
+        caminho (str): Path of the SQLite store.
+
+    Returns:
+        DataFrame: The bars ordered by symbol and datetime, in the `compactar_precos` layout,
+                   empty if none match.
+    """
+    colunas = [coluna for coluna in STORE_COLUMNS if colunas is None or coluna in colunas]
+    if not os.path.exists(caminho):
+        return pd.DataFrame(columns=colunas)
+
+    condicoes = ["interval = ?"]
+    parametros = [intervalo]
+    if simbolos is not None:
+        simbolos = list(simbolos)
+        if not simbolos:
+            return pd.DataFrame(columns=colunas)
+        condicoes.append(f"symbol IN ({', '.join('?' * len(simbolos))})")
+        parametros.extend(simbolos)
+    if inicio is not None:
+        condicoes.append("datetime >= ?")
+        parametros.append(pd.Timestamp(inicio).strftime(DATETIME_FORMAT))
+    if fim is not None:
+        condicoes.append("datetime < ?")
+        parametros.append(pd.Timestamp(fim).strftime(DATETIME_FORMAT))
+
+    consulta = f"SELECT {', '.join(colunas)} FROM prices WHERE {' AND '.join(condicoes)} ORDER BY symbol, datetime"
+    with _conectar(caminho) as conexao:
+        precos = pd.read_sql_query(consulta, conexao, params=parametros)
+    if "datetime" in precos.columns:
+        precos["datetime"] = pd.to_datetime(precos["datetime"], format=DATETIME_FORMAT)
+    return compactar_precos(precos)
+
+
+def limites_datetimes(simbolos, intervalo, caminho=STORE_FILE):
+    """
+    Returns the earliest and latest stored bar of each symbol.
+
+    Returns:
+        DataFrame: 'primeiro' and 'ultimo' datetimes indexed by symbol; symbols without bars are absent.
+    """
+    simbolos = list(simbolos)
+    if not simbolos or not os.path.exists(caminho):
+        return pd.DataFrame({"primeiro": pd.Series(dtype="datetime64[ns]"),
+                             "ultimo": pd.Series(dtype="datetime64[ns]")}).rename_axis("symbol")
+    consulta = (f"SELECT symbol, MIN(datetime) AS primeiro, MAX(datetime) AS ultimo FROM prices "
+                f"WHERE interval = ? AND symbol IN ({', '.join('?' * len(simbolos))}) GROUP BY symbol")
+    with _conectar(caminho) as conexao:
+        limites = pd.read_sql_query(consulta, conexao, params=[intervalo] + simbolos).set_index("symbol")
+    return limites.apply(pd.to_datetime, format=DATETIME_FORMAT)
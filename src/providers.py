@@ -0,0 +1,254 @@
+"""
+Data providers: where prices, company info and the B3 consolidated file come from.
+
+A provider bundles the four sources the data layer reads from. `PROVEDOR_YFINANCE` calls the live
+Yahoo and GitHub endpoints; `provedor_replay` serves recorded fixtures and synthetic OHLCV from
+disk, so every fetch and analytics path can be run and timed offline, with reproducible results.
+
+The active provider is chosen with `definir_provedor`, or with the CLICKSTOCK_PROVIDER environment
+variable ("yfinance" or "replay") when the app or the refresher starts.
+"""
+import json
+import logging
+import os
+import zlib
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from price_store import inicio_do_periodo
+
+FETCH_TIMEOUT = 10  # seconds, per request
+REPLAY_DIR = os.path.join("src", "fixtures")
+REPLAY_B3_FILE = "temp_cached_b3.csv"
+REPLAY_NOW = pd.Timestamp("2025-01-27 18:00")  # the replayed market "now": the date of the B3 fixture
+REPLAY_SESSION = ("10:00", "17:00")  # B3 regular session, local time
+REPLAY_DAILY_HISTORY = pd.DateOffset(years=10)
+REPLAY_INTRADAY_HISTORY = pd.DateOffset(days=60)  # yfinance serves at most 60 days of intraday bars
+REPLAY_INDUSTRIES = ["Banks—Regional", "Oil & Gas Integrated", "Other Industrial Metals & Mining",
+                     "Utilities—Regulated Electric", "Beverages—Brewers", "Airlines", "Steel"]
+_MINUTE_INTERVALS = {"1m": 1, "2m": 2, "5m": 5, "15m": 15, "30m": 30, "60m": 60, "90m": 90, "1h": 60}
+_DAILY_FREQUENCIES = {"1d": "B", "5d": "5B", "1wk": "W-MON", "1mo": "MS", "3mo": "QS"}
+_PRICE_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+
+Provedor = namedtuple("Provedor", ["download", "download_lote", "info", "arquivo", "agora"])
+Provedor.__doc__ = """
+Sources of the data layer.
+
+    download(ticker, timeout=..., **parametros): single-symbol yfinance-like frame.
+    download_lote(tickers, timeout=..., **parametros): multi-symbol frame with (ticker, field) columns.
+    info(ticker): company info dict, as `yf.Ticker(ticker).info`.
+    arquivo(url, chunk_size): iterable of the byte chunks of a remote file.
+    agora(): the current market time, which periods such as "1y" are counted back from.
+"""
+
+
+def _yf_download(ticker, **parametros):
+    """Default price source: a single-symbol `yf.download` call."""
+    import yfinance as yf
+
+    return yf.download(ticker, progress=False, threads=False, **parametros)
+
+
+def _yf_download_lote(tickers, **parametros):
+    """Default batched price source: one multi-symbol `yf.download` call grouped by ticker."""
+    import yfinance as yf
+
+    return yf.download(tickers, progress=False, group_by="ticker", **parametros)
+
+
+def _yf_info(ticker):
+    """Default company info source: the `yf.Ticker(ticker).info` dictionary."""
+    import yfinance as yf
+
+    return yf.Ticker(ticker).info
+
+
+def _http_arquivo(url, chunk_size):
+    """Streams a file over HTTP, raising `requests.exceptions.RequestException` on failure."""
+    import requests
+
+    with requests.get(url, stream=True, timeout=FETCH_TIMEOUT) as response:
+        response.raise_for_status()  # Check for HTTP errors
+        yield from response.iter_content(chunk_size=chunk_size)
+
+
+PROVEDOR_YFINANCE = Provedor(_yf_download, _yf_download_lote, _yf_info, _http_arquivo, pd.Timestamp.now)
+
+
+def _semente(*partes):
+    """Stable seed for the synthetic data of a ticker, independent of PYTHONHASHSEED."""
+    return zlib.crc32("|".join(map(str, partes)).encode())
+
+
+@lru_cache(maxsize=32)
+def _calendario(intervalo, fim):
+    """Bar timestamps of an interval over the replayed history, ending at `fim`. Shared by every ticker."""
+    if intervalo in _MINUTE_INTERVALS:
+        dias = pd.bdate_range(fim - REPLAY_INTRADAY_HISTORY, fim, normalize=True)
+        abertura, fechamento = (pd.Timedelta(f"{horario}:00") for horario in REPLAY_SESSION)
+        passo = pd.Timedelta(minutes=_MINUTE_INTERVALS[intervalo])
+        deslocamentos = pd.timedelta_range(abertura, fechamento - passo, freq=passo)
+        datas = (dias.to_numpy()[:, None] + deslocamentos.to_numpy()[None, :]).ravel()
+        return pd.DatetimeIndex(datas[datas <= fim.to_datetime64()], name="Datetime")
+    if intervalo not in _DAILY_FREQUENCIES:
+        raise ValueError(f"Unknown interval {intervalo!r}")
+    # daily bars are stamped at midnight, as yfinance does
+    return pd.date_range((fim - REPLAY_DAILY_HISTORY).normalize(), fim.normalize(), freq=_DAILY_FREQUENCIES[intervalo],
+                         name="Date")
+
+
+@lru_cache(maxsize=256)
+def _serie_sintetica(ticker, intervalo, semente):
+    """
+    Deterministic OHLCV path of a ticker over the whole replayed history.
+
+    Closes follow a geometric random walk seeded by (ticker, interval, semente), so any range
+    requested later is a slice of the same path and overlapping requests agree.
+    """
+    datas = _calendario(intervalo, REPLAY_NOW)
+    rng = np.random.default_rng(_semente(ticker, intervalo, semente))
+    volatilidade = 0.02 if intervalo in _DAILY_FREQUENCIES else 0.002
+    inicial = rng.uniform(5, 120)
+    fechamentos = inicial * np.exp(np.cumsum(rng.normal(0, volatilidade, len(datas))))
+    aberturas = np.concatenate(([inicial], fechamentos[:-1]))
+    amplitude = np.abs(rng.normal(0, volatilidade / 2, len(datas)))
+    return pd.DataFrame({
+        "Open": aberturas,
+        "High": np.maximum(aberturas, fechamentos) * (1 + amplitude),
+        "Low": np.minimum(aberturas, fechamentos) * (1 - amplitude),
+        "Close": fechamentos,
+        "Volume": rng.integers(1_000, 5_000_000, len(datas)).astype(float),
+    }, index=datas)
+
+
+def _intervalo_pedido(parametros):
+    """Resolves the `start`/`end`/`period` download parameters to a [start, end) range, as yfinance does."""
+    fim = pd.Timestamp(parametros["end"]) if parametros.get("end") is not None else None
+    if parametros.get("start") is not None:
+        inicio = pd.Timestamp(parametros["start"])
+    elif fim is not None and parametros.get("period") is None:
+        inicio = None  # an `end` alone reaches back to the start of the history
+    else:
+        inicio = inicio_do_periodo(parametros.get("period") or "1mo", agora=REPLAY_NOW)
+    return tuple(data.tz_localize(None) if data is not None and data.tz is not None else data
+                 for data in (inicio, fim))
+
+
+def provedor_replay(diretorio=REPLAY_DIR, arquivo_b3=REPLAY_B3_FILE, semente=0):
+    """
+    Builds a provider that never touches the network.
+
+    Prices come from the fixtures recorded by `gravar_replay` (`<diretorio>/<ticker>_<interval>.parquet`)
+    when present and from a deterministic synthetic path otherwise; company info comes from
+    `<diretorio>/info.json`, falling back to synthetic info; every remote file is served from
+    `arquivo_b3`. Time is frozen at `REPLAY_NOW`, which `agora` returns, so periods resolve to the
+    same bars on every run, in the provider and in the price store queries alike.
+
+    Args:
+        diretorio (str): Directory with the recorded fixtures.
+        arquivo_b3 (str): Local copy of the B3 consolidated file.
+        semente (int): Seed of the synthetic prices; change it to get a different, still reproducible, market.
+
+    Returns:
+        Provedor: The replay provider.
+    """
+    def historico(ticker, intervalo):
+        caminho = os.path.join(diretorio, f"{ticker}_{intervalo}.parquet")
+        if not os.path.exists(caminho):
+            return _serie_sintetica(ticker, intervalo, semente)
+        dados = pd.read_parquet(caminho)
+        if dados.index.tz is not None:
+            dados.index = dados.index.tz_localize(None)  # compare in exchange wall time, like the store
+        return dados
+
+    def download(ticker, timeout=None, interval="1d", **parametros):
+        dados = historico(ticker, interval)
+        inicio, fim = _intervalo_pedido(parametros)
+        if inicio is not None:
+            dados = dados[dados.index >= inicio]
+        if fim is not None:
+            dados = dados[dados.index < fim]
+        return dados.copy()
+
+    def download_lote(tickers, timeout=None, **parametros):
+        quadros = {ticker: download(ticker, **parametros) for ticker in tickers}
+        return pd.concat(quadros, axis=1) if quadros else pd.DataFrame()
+
+    infos = {}
+    caminho_info = os.path.join(diretorio, "info.json")
+    if os.path.exists(caminho_info):
+        with open(caminho_info, encoding="utf-8") as arquivo:
+            infos = json.load(arquivo)
+
+    def info(ticker):
+        if ticker in infos:
+            return infos[ticker]
+        return {"industry": REPLAY_INDUSTRIES[_semente(ticker) % len(REPLAY_INDUSTRIES)],
+                "longBusinessSummary": f"Replayed company {ticker}.", "market": "br_market"}
+
+    def arquivo(url, chunk_size):
+        with open(arquivo_b3, "rb") as origem:
+            while chunk := origem.read(chunk_size):
+                yield chunk
+
+    return Provedor(download, download_lote, info, arquivo, lambda: REPLAY_NOW)
+
+
+def gravar_replay(tickers, intervalo, periodo, diretorio=REPLAY_DIR, provedor=PROVEDOR_YFINANCE):
+    """
+    Records live prices and company info as fixtures for `provedor_replay`.
+
+    Args:
+        tickers (list): The stock ticker symbols.
+        intervalo (str): The bar interval to record.
+        periodo (str): The period to record.
+        diretorio (str): Directory the fixtures are written to.
+        provedor (Provedor): Provider the data is recorded from.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    for ticker in tickers:
+        dados = provedor.download(ticker, timeout=FETCH_TIMEOUT, interval=intervalo, period=periodo)
+        if dados is None or dados.empty:
+            logging.warning("Nothing to record for %s", ticker)
+            continue
+        if isinstance(dados.columns, pd.MultiIndex):
+            dados.columns = dados.columns.get_level_values(0)
+        dados[[campo for campo in _PRICE_FIELDS if campo in dados.columns]].to_parquet(
+            os.path.join(diretorio, f"{ticker}_{intervalo}.parquet"))
+
+    caminho_info = os.path.join(diretorio, "info.json")
+    infos = {}
+    if os.path.exists(caminho_info):
+        with open(caminho_info, encoding="utf-8") as arquivo:
+            infos = json.load(arquivo)
+    for ticker in tickers:
+        try:
+            info = provedor.info(ticker)
+            infos[ticker] = {chave: info.get(chave, "N/A") for chave in ("industry", "longBusinessSummary", "market")}
+        except Exception as e:
+            logging.error("Error recording info for %s: %s", ticker, e)
+    with open(caminho_info, "w", encoding="utf-8") as arquivo:
+        json.dump(infos, arquivo, ensure_ascii=False, indent=1, sort_keys=True)
+    logging.info("Recorded %s tickers (%s, %s) in %s", len(tickers), intervalo, periodo, diretorio)
+
+
+_PROVEDORES = {"yfinance": lambda: PROVEDOR_YFINANCE, "replay": provedor_replay}
+_provedor = None  # resolved on first use, so importing this module reads no files
+
+
+def definir_provedor(provedor):
+    """Makes `provedor` the source of every fetch that doesn't pass its own; returns the previous one."""
+    global _provedor
+    anterior, _provedor = _provedor, provedor
+    return anterior
+
+
+def provedor_atual():
+    """Returns the active provider, picking it from CLICKSTOCK_PROVIDER on first use."""
+    global _provedor
+    if _provedor is None:
+        _provedor = _PROVEDORES.get(os.environ.get("CLICKSTOCK_PROVIDER", "yfinance"), _PROVEDORES["yfinance"])()
+    return _provedor
@@ -0,0 +1,73 @@
+"""
+Background refresher: fetches prices, industries and company info on a schedule and publishes
+them as an atomically swapped snapshot, so the Streamlit pages never wait on the network.
+
+Usage:
+    python src/refresher.py            # refresh every REFRESH_SECONDS
+    python src/refresher.py --once     # refresh a single time and exit
+"""
+import argparse
+import concurrent.futures
+import logging
+import os
+import time
+
+from analitics import (MAX_WORKERS, atualizar_precos_incremental, baixar_top_industry, get_company_info, ler_cache,
+                       preencher_industry, salvar_cache)
+from logging_setup import configurar_logging
+from snapshot import SNAPSHOT_DIR, publicar_snapshot
+
+REFRESH_SECONDS = 15 * 60
+SNAPSHOT_INTERVAL = "1d"
+SNAPSHOT_PERIOD = "5y"  # covers the default date range of the Comparativo page
+# The refresher's own working caches, apart from the ones the pages' "Atualizar" buttons rewrite
+REFRESHER_FILE_INDUSTRY = os.path.join(SNAPSHOT_DIR, "refresher_top_industry.parquet")
+REFRESHER_FILE_PRICES = os.path.join(SNAPSHOT_DIR, "refresher_precos.parquet")
+
+
+def atualizar_snapshot(intervalo=SNAPSHOT_INTERVAL, periodo=SNAPSHOT_PERIOD):
+    """
+    Runs one refresh: top companies and industries, prices and company info, then publishes them.
+
+    Returns:
+        str: The published snapshot directory, or None if the top companies could not be loaded.
+    """
+    if os.path.exists(REFRESHER_FILE_INDUSTRY):
+        # the industry cache only refetches expired entries
+        df_top_industry = preencher_industry(ler_cache(REFRESHER_FILE_INDUSTRY))
+    else:
+        df_top_industry = baixar_top_industry()
+        if df_top_industry is None:
+            logging.error("Could not load the top companies; snapshot not published.")
+            return None
+    salvar_cache(df_top_industry, REFRESHER_FILE_INDUSTRY)
+    tickers = df_top_industry['TckrSymb'].tolist()
+
+    df_precos = atualizar_precos_incremental(tickers, intervalo, periodo, caminho=REFRESHER_FILE_PRICES)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        empresas = dict(zip(tickers, executor.map(get_company_info, tickers)))
+
+    return publicar_snapshot(df_top_industry, df_precos, empresas, {"interval": intervalo, "period": periodo})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publishes data snapshots for the Streamlit app.")
+    parser.add_argument("--once", action="store_true", help="refresh a single time and exit")
+    parser.add_argument("--every", type=float, default=REFRESH_SECONDS, help="seconds between refreshes")
+    args = parser.parse_args()
+    configurar_logging()
+
+    while True:
+        inicio = time.monotonic()
+        try:
+            atualizar_snapshot()
+        except Exception as e:
+            logging.error("Snapshot refresh failed: %s", e)
+        if args.once:
+            break
+        time.sleep(max(0.0, args.every - (time.monotonic() - inicio)))
+
+
+if __name__ == "__main__":
+    main()
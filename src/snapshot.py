@@ -0,0 +1,84 @@
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+
+from analitics import OUTPUT_DIR, ler_cache, salvar_cache
+
+SNAPSHOT_DIR = os.path.join(OUTPUT_DIR, "snapshots")
+SNAPSHOT_KEEP = 3  # published snapshots kept, so readers of an older one are not cut off
+SNAPSHOT_INDUSTRY = "top_industry.parquet"
+SNAPSHOT_PRICES = "precos.parquet"
+SNAPSHOT_COMPANIES = "empresas.json"
+
+
+def publicar_snapshot(df_top_industry, df_precos, empresas, metadados=None, diretorio=SNAPSHOT_DIR):
+    """
+    Writes a complete snapshot to a new directory and then swaps the CURRENT pointer to it.
+
+    Readers follow the pointer, so they see either the previous snapshot or the new one, never a
+    partially written one.
+
+    Args:
+        df_top_industry (DataFrame): The top companies with their industries.
+        df_precos (DataFrame): Long-format prices of those companies.
+        empresas (dict): Company info (profile, market) by ticker.
+        metadados (dict): Extra values stored in the manifest, such as the price interval.
+        diretorio (str): Directory holding the snapshots.
+
+    Returns:
+        str: The published snapshot directory.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    nome = datetime.now().strftime("%Y%m%d-%H%M%S-%f") + f"-{os.getpid()}"
+    destino = os.path.join(diretorio, nome)
+    os.makedirs(destino)
+
+    salvar_cache(df_top_industry, os.path.join(destino, SNAPSHOT_INDUSTRY))
+    salvar_cache(df_precos, os.path.join(destino, SNAPSHOT_PRICES))
+    manifesto = {"created_at": time.time(), "empresas": empresas, **(metadados or {})}
+    with open(os.path.join(destino, SNAPSHOT_COMPANIES), "w", encoding="utf-8") as arquivo:
+        json.dump(manifesto, arquivo, ensure_ascii=False)
+
+    ponteiro = os.path.join(diretorio, "CURRENT")
+    with open(f"{ponteiro}.tmp", "w", encoding="utf-8") as arquivo:
+        arquivo.write(nome)
+    os.replace(f"{ponteiro}.tmp", ponteiro)
+    logging.info("Published snapshot %s", destino)
+
+    _remover_snapshots_antigos(diretorio)
+    return destino
+
+
+def _remover_snapshots_antigos(diretorio):
+    """Deletes all but the `SNAPSHOT_KEEP` newest snapshot directories."""
+    snapshots = sorted(nome for nome in os.listdir(diretorio) if os.path.isdir(os.path.join(diretorio, nome)))
+    for nome in snapshots[:-SNAPSHOT_KEEP]:
+        shutil.rmtree(os.path.join(diretorio, nome), ignore_errors=True)
+
+
+def snapshot_atual(diretorio=SNAPSHOT_DIR):
+    """Returns the directory of the current snapshot, or None if none was published."""
+    try:
+        with open(os.path.join(diretorio, "CURRENT"), encoding="utf-8") as arquivo:
+            destino = os.path.join(diretorio, arquivo.read().strip())
+    except FileNotFoundError:
+        return None
+    return destino if os.path.isdir(destino) else None
+
+
+def ler_snapshot(destino, colunas_industry=None, colunas_precos=None):
+    """
+    Reads a published snapshot.
+
+    Returns:
+        tuple: The top companies frame, the prices frame and the manifest dict
+               (with the company info under "empresas").
+    """
+    df_top_industry = ler_cache(os.path.join(destino, SNAPSHOT_INDUSTRY), colunas_industry)
+    df_precos = ler_cache(os.path.join(destino, SNAPSHOT_PRICES), colunas_precos)
+    with open(os.path.join(destino, SNAPSHOT_COMPANIES), encoding="utf-8") as arquivo:
+        manifesto = json.load(arquivo)
+    return df_top_industry, df_precos, manifesto
@@ -1,3 +1,3 @@
 import streamlit as st
 
-        st.write("Hello from Streamlit!")
\ No newline at end of file
+st.write("Hello from Streamlit!")
@@ -0,0 +1,136 @@
+"""
+Lightweight timing spans for the data layer.
+
+Wrap a block with `medir("stage")` or a function with `@cronometrado()`; each span records its
+wall time, the rows it produced and its cache hits and misses. `relatorio()` aggregates them per
+stage into p50/p95 latencies, shown on the hidden diagnostics page or dumped with `relatorio_json()`.
+"""
+import contextvars
+import functools
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+MAX_SAMPLES = 1000  # latest spans kept per stage
+
+_medicoes = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+_lock = threading.Lock()
+_span_atual = contextvars.ContextVar("span_atual", default=None)
+
+
+def _contar_linhas(resultado):
+    """Rows of a DataFrame or Series result, or of the frames of a tuple/list result; None otherwise."""
+    if isinstance(resultado, (pd.DataFrame, pd.Series)):
+        return len(resultado)
+    if isinstance(resultado, (tuple, list)):
+        linhas = [len(item) for item in resultado if isinstance(item, (pd.DataFrame, pd.Series))]
+        return sum(linhas) if linhas else None
+    return None
+
+
+@contextmanager
+def medir(nome):
+    """
+    Times a block as one span of the stage `nome`.
+
+    Yields:
+        dict: The span, whose 'linhas', 'acertos' and 'falhas' the block may fill in directly or
+              through `registrar_linhas` and `registrar_cache`.
+    """
+    span = {"linhas": None, "acertos": 0, "falhas": 0}
+    token = _span_atual.set(span)
+    inicio = time.perf_counter()
+    try:
+        yield span
+    finally:
+        span["segundos"] = time.perf_counter() - inicio
+        _span_atual.reset(token)
+        with _lock:
+            _medicoes[nome].append(span)
+
+
+def cronometrado(nome=None, cache_padrao=None):
+    """
+    Decorator that times every call of a function as a span of the stage `nome`.
+
+    Args:
+        nome (str): Stage name; the function's module and qualified name when None.
+        cache_padrao (bool): For functions fronting a cache whose misses are recorded further down:
+            a call that recorded neither a hit nor a miss counts as a hit when True.
+    """
+    def decorador(funcao):
+        estagio = nome or f"{funcao.__module__}.{funcao.__qualname__}"
+
+        @functools.wraps(funcao)
+        def cronometrar(*args, **kwargs):
+            with medir(estagio) as span:
+                resultado = funcao(*args, **kwargs)
+                if span["linhas"] is None:
+                    span["linhas"] = _contar_linhas(resultado)
+                if cache_padrao and not span["acertos"] and not span["falhas"]:
+                    span["acertos"] = 1
+                return resultado
+        return cronometrar
+    return decorador
+
+
+def registrar_linhas(linhas):
+    """Sets the rows processed by the current span, if there is one."""
+    span = _span_atual.get()
+    if span is not None:
+        span["linhas"] = linhas
+
+
+def registrar_cache(acertos=0, falhas=0):
+    """Adds cache hits and misses to the current span, if there is one."""
+    span = _span_atual.get()
+    if span is not None:
+        span["acertos"] += acertos
+        span["falhas"] += falhas
+
+
+def relatorio():
+    """
+    Aggregates the recorded spans per stage.
+
+    Returns:
+        DataFrame: One row per stage, slowest p95 first, with the number of calls, p50, p95 and
+                   max wall time in milliseconds, rows processed and cache hits and misses.
+    """
+    with _lock:
+        medicoes = {nome: list(spans) for nome, spans in _medicoes.items()}
+    linhas = []
+    for nome, spans in medicoes.items():
+        milissegundos = np.array([span["segundos"] for span in spans]) * 1000
+        linhas.append({
+            "estagio": nome,
+            "chamadas": len(spans),
+            "p50_ms": float(np.percentile(milissegundos, 50)),
+            "p95_ms": float(np.percentile(milissegundos, 95)),
+            "max_ms": float(milissegundos.max()),
+            "linhas": int(sum(span["linhas"] or 0 for span in spans)),
+            "acertos_cache": int(sum(span["acertos"] for span in spans)),
+            "falhas_cache": int(sum(span["falhas"] for span in spans)),
+        })
+    colunas = ["estagio", "chamadas", "p50_ms", "p95_ms", "max_ms", "linhas", "acertos_cache", "falhas_cache"]
+    return pd.DataFrame(linhas, columns=colunas).sort_values("p95_ms", ascending=False, ignore_index=True)
+
+
+def relatorio_json(caminho=None):
+    """Returns the `relatorio` as JSON, also writing it to `caminho` when given."""
+    texto = json.dumps(relatorio().to_dict(orient="records"), indent=1)
+    if caminho is not None:
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+    return texto
+
+
+def limpar_medicoes():
+    """Forgets every recorded span."""
+    with _lock:
+        _medicoes.clear()